@@ -13,6 +13,8 @@ JSON_DIRECTORY = r"C:\Users\Fried\OneDrive\Dokumente\PyCharmProjects_sync\Straic
 # **Global Variable**
 # Speichert den Namen des ausgewählten Modells
 MODEL_NAME = None
+# Speichert Wortlimit und maximale Ausgabe des ausgewählten Modells
+MODEL_LIMITS = None
 
 def get_latest_json_file():
     """
@@ -73,9 +75,13 @@ class ModelViewer:
 
         :param event: Tkinter-Ereignis (optional)
         """
-        global MODEL_NAME
+        global MODEL_NAME, MODEL_LIMITS
         current_model = self.data[self.index]
         MODEL_NAME = current_model['model']  # Speichere Modell-Namen
+        MODEL_LIMITS = {
+            'word_limit': int(current_model['word_limit']),
+            'max_output': int(current_model['max_output'])
+        }
         self.root.destroy()  # Schließe GUI
 
     def display_record(self):
@@ -155,6 +161,30 @@ class ModelViewer:
             messagebox.showinfo("Anfang", "Dies ist der erste Datensatz.")
 
 
+def get_model_limits(model_name):
+    """
+    Liest Wortlimit und maximale Ausgabe eines Modells aus der neuesten JSON-Datei.
+
+    :param model_name: Name des Modells, z.B. 'openai/gpt-4o'
+    :return: Dictionary mit 'word_limit' und 'max_output' (oder None, wenn das Modell nicht gefunden wird)
+    """
+    if MODEL_LIMITS and model_name == MODEL_NAME:
+        return MODEL_LIMITS
+    try:
+        with open(get_latest_json_file(), 'r') as file:
+            data = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"Fehler beim Lesen der Modell-Limits: {str(e)}")
+        return None
+    for model_data in data['data']['chat']:
+        if model_data['model'] == model_name:
+            return {
+                'word_limit': int(model_data['word_limit']),
+                'max_output': int(model_data['max_output'])
+            }
+    return None
+
+
 def StraicoModelleLesen():
     """
     Haupt-Funktion:
@@ -1,6 +1,7 @@
 # Import der notwendigen Bibliothek
 from lxml import etree
 import os
+from profiling import configure_profiling, profile_stage
 
 # Input filename
 INPUT_FILENAME = 'CalwerFULL_241009_out_TransBiblEnDe.xml'
@@ -12,12 +13,12 @@ OUTPUT_TXT_PATH = 'C:/Users/Fried/documents/LectorAssistant/logos_tags/bearbeite
 INPUT_FILE = os.path.join(DIRECTORY_PATH, INPUT_FILENAME)
 OUTPUT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_AbsInXml.xml')
 
+# Profile the stages with cProfile / tracemalloc; reports are written next to OUTPUT_FILE
+PROFILE = False
+PROFILE_MEMORY = False
 
 
 
-# XML-Datei einlesen
-tree = etree.parse(INPUT_FILE)
-root = tree.getroot()
 
 def split_p_element(p_elem):
     """
@@ -100,51 +101,77 @@ def split_p_element(p_elem):
 
     return new_p_elements
 
-# Über <article>-Elemente iterieren
-ns = root.nsmap  # Namespaces aus der Wurzel erhalten
-for article in root.findall('.//article', namespaces=ns):
-    # Listen zum Speichern der zu ersetzenden <p>-Elemente
-    p_elements_to_remove = []
-    new_p_elements_info = []
+def split_paragraphs(root):
+    """
+    Teilt alle <p>-Elemente der Artikel an jeder Stelle von "StartAbsatz" in mehrere <p>-Elemente.
 
-    # Über die <p>-Elemente innerhalb des <article>-Elements iterieren
-    for p_elem in article.findall('.//p', namespaces=ns):
-        # Teile das <p>-Element bei jedem Vorkommen von "StartAbsatz"
-        new_p_elements = split_p_element(p_elem)
+    Args:
+    root: Wurzelelement des lxml-Baums, wird direkt verändert.
 
-        if len(new_p_elements) > 1:
-            # Aufteilung ist erfolgt
-            parent = p_elem.getparent()
-            index = parent.index(p_elem)
-            new_p_elements_info.append((parent, index, new_p_elements))
-            p_elements_to_remove.append(p_elem)
-        elif len(new_p_elements) == 1:
-            # Keine Aufteilung erfolgt; aktualisiere das ursprüngliche <p>-Element
-            new_p_elem = new_p_elements[0]
-            p_elem.clear()
-            p_elem.extend(new_p_elem)
-            p_elem.text = new_p_elem.text
-        else:
-            # new_p_elements ist leer
-            # Behandle das leere Element entsprechend deinen Anforderungen
-            # Zum Beispiel: Entferne das leere <p>-Element
+    Returns:
+    Das veränderte Wurzelelement.
+    """
+    # Über <article>-Elemente iterieren
+    ns = root.nsmap  # Namespaces aus der Wurzel erhalten
+    for article in root.findall('.//article', namespaces=ns):
+        # Listen zum Speichern der zu ersetzenden <p>-Elemente
+        p_elements_to_remove = []
+        new_p_elements_info = []
+
+        # Über die <p>-Elemente innerhalb des <article>-Elements iterieren
+        for p_elem in article.findall('.//p', namespaces=ns):
+            # Teile das <p>-Element bei jedem Vorkommen von "StartAbsatz"
+            new_p_elements = split_p_element(p_elem)
+
+            if len(new_p_elements) > 1:
+                # Aufteilung ist erfolgt
+                parent = p_elem.getparent()
+                index = parent.index(p_elem)
+                new_p_elements_info.append((parent, index, new_p_elements))
+                p_elements_to_remove.append(p_elem)
+            elif len(new_p_elements) == 1:
+                # Keine Aufteilung erfolgt; aktualisiere das ursprüngliche <p>-Element
+                new_p_elem = new_p_elements[0]
+                p_elem.clear()
+                p_elem.extend(new_p_elem)
+                p_elem.text = new_p_elem.text
+            else:
+                # new_p_elements ist leer
+                # Behandle das leere Element entsprechend deinen Anforderungen
+                # Zum Beispiel: Entferne das leere <p>-Element
+                parent = p_elem.getparent()
+                if parent is not None:
+                    parent.remove(p_elem)
+
+        # Entferne die markierten ursprünglichen <p>-Elemente
+        for p_elem in p_elements_to_remove:
             parent = p_elem.getparent()
             if parent is not None:
                 parent.remove(p_elem)
 
-    # Entferne die markierten ursprünglichen <p>-Elemente
-    for p_elem in p_elements_to_remove:
-        parent = p_elem.getparent()
-        if parent is not None:
-            parent.remove(p_elem)
+        # Füge die neuen <p>-Elemente an den richtigen Positionen ein
+        for parent, index, new_p_elems in new_p_elements_info:
+            for offset, new_p in enumerate(new_p_elems):
+                parent.insert(index + offset, new_p)
+    return root
+
+
+def main():
+    configure_profiling(OUTPUT_FILE, PROFILE, PROFILE_MEMORY)
+
+    # XML-Datei einlesen
+    with profile_stage('parse_input'):
+        tree = etree.parse(INPUT_FILE)
+    with profile_stage('split_paragraphs'):
+        split_paragraphs(tree.getroot())
+
+    # Aktualisierte XML-Struktur in einer neuen Datei speichern
+    with profile_stage('write_output'):
+        tree.write(OUTPUT_FILE, encoding='utf-8', xml_declaration=True)
 
-    # Füge die neuen <p>-Elemente an den richtigen Positionen ein
-    for parent, index, new_p_elems in new_p_elements_info:
-        for offset, new_p in enumerate(new_p_elems):
-            parent.insert(index + offset, new_p)
+    print(f"XML file has been processed successfully: {OUTPUT_FILE}")
+    print("Processing completed successfully.")
 
-# Aktualisierte XML-Struktur in einer neuen Datei speichern
-tree.write(OUTPUT_FILE, encoding='utf-8', xml_declaration=True)
 
-print(f"XML file has been processed successfully: {OUTPUT_FILE}")
-print("Processing completed successfully.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+'''Misst den Eigenaufwand der gesamten Verarbeitungskette ohne die Antwortzeit eines LLM-Anbieters.
+Erzeugt ein synthetisches Lexikon im Logos xml-Format (articles / article id / p / data ref="Bible:...") und
+einen synthetischen Text im WF1234-Format in wählbarer Größe und lässt alle Schritte darauf laufen; die
+LLM-Aufrufe beantwortet der Anbieter 'mock' aus main.py nach MOCK_LATENCY Sekunden mit dem unveränderten Text.
+Je Schritt werden Laufzeit, Durchsatz und Spitzenspeicher der Python-Objekte (tracemalloc, ohne den Speicher
+von lxml) ausgegeben und mit der Datei BASELINE_FILE im temporären Verzeichnis (oder der beim Aufruf angegebenen Datei)
+verglichen, die beim ersten Lauf angelegt wird.
+
+Aufruf: python benchmark.py [Anzahl_Artikel] [Latenz_in_Sekunden] [Baseline-Datei]'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+import tracemalloc
+import contextlib
+import xml.etree.ElementTree as ET
+from lxml import etree
+
+import main
+from benchmark_wf_markup import create_book
+
+# Size of the synthetic lexicon
+ARTICLES = 200
+PARAGRAPHS_PER_ARTICLE = 8
+MOCK_LATENCY = 0.0  # Seconds per mock request; 0 measures only the overhead of the pipeline
+CONCURRENCY = 8  # Used by the steps that send requests concurrently
+
+BASELINE_FILE = os.path.join(tempfile.gettempdir(), 'lectassist_benchmark_baseline.json')
+REGRESSION_FACTOR = 1.25  # A step is reported if it is this much slower or larger than the baseline
+MIN_COMPARED_SECONDS = 0.2  # Shorter durations vary too much to be compared
+
+BIBLE_BOOKS = ['Bible:Ge', 'Bible:Ps', 'Bible:Is', 'Bible:Mt', 'Bible:Jn', 'Bible:Ro', 'Bible:1 Co', 'Bible:Heb']
+SENTENCE = 'Der Apostel schreibt der Gemeinde von der Gerechtigkeit, die vor Gott gilt. '
+
+
+def create_lexicon_xml(articles=ARTICLES, paragraphs=PARAGRAPHS_PER_ARTICLE):
+    """
+    Creates a synthetic lexicon in the Logos XML format. Every paragraph holds a Bible reference, every
+    second paragraph a "StartAbsatz" marker and every fourth paragraph a {{headline}}.
+
+    Returns:
+    str: The XML document.
+    """
+    root = etree.Element('logos-resource-content')
+    articles_element = etree.SubElement(root, 'articles')
+    for a in range(1, articles + 1):
+        article = etree.SubElement(articles_element, 'article', id=f'A.{a}')
+        toc_entry = etree.SubElement(article, 'toc-entry', level='2')
+        toc_entry.text = f'Stichwort {a}'
+        for p in range(paragraphs):
+            paragraph = etree.SubElement(article, 'p')
+            paragraph.text = ('{{Schlagzeile %d}} ' % p if p % 4 == 0 else '') + SENTENCE * 3
+            book = BIBLE_BOOKS[(a + p) % len(BIBLE_BOOKS)]
+            reference = etree.SubElement(paragraph, 'data', ref=f'{book} {p + 1}:{a % 30 + 1}')
+            reference.text = f'{book[6:]} {p + 1},{a % 30 + 1}'
+            reference.tail = ' ' + ('StartAbsatz ' if p % 2 else '') + SENTENCE * 2
+    return etree.tostring(root, encoding='unicode')
+
+
+def create_plain_text(lexicon_xml):
+    """Returns the text of the lexicon as plain text for the 'text' mode."""
+    root = ET.fromstring(lexicon_xml)
+    return '\n\n'.join(''.join(p.itertext()) for p in root.iter('p'))
+
+
+def run_stage(name, function, units):
+    """
+    Runs one step with its output suppressed. A step that counts its units itself returns their number,
+    which replaces `units`.
+
+    Returns:
+    dict: Duration in seconds, processed units, units per second and peak memory in MiB.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w', encoding='utf-8') as null, contextlib.redirect_stdout(null):
+        counted = function()
+    duration = time.perf_counter() - start
+    if counted is not None:
+        units = counted
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'stage': name, 'seconds': duration, 'units': units, 'units_per_second': units / duration,
+            'peak_mib': peak / 2 ** 20}
+
+
+def stages(directory, lexicon_file, text_file, book_file, articles, paragraphs):
+    """Returns the steps of the pipeline as (name, function, units) with their input and output files."""
+    import process_txt
+    import process_xml_paragraph
+    import process_xml_article
+    import absatz_in_xml
+    import ueberschrift_in_xml
+    import bibelstellen_en_de
+    import create_logos_xml
+    import create_obsidian_md
+    from wf_markup import parse, iter_nodes_from_file
+
+    def output(name):
+        return os.path.join(directory, name)
+
+    def xml_paragraph():
+        process_xml_paragraph.process_xml_file('mock', 'mock', lexicon_file, output('paragraph_check.json'),
+                                               output('paragraph_out.xml'), concurrency=CONCURRENCY)
+
+    def xml_article():
+        process_xml_article.process_xml_file('mock', 'mock', lexicon_file, output('article_check.json'),
+                                             output('article_out.xml'), concurrency=CONCURRENCY)
+
+    def text():
+        # The units of the text mode are the chunks of split_text()
+        main.metrics.start()
+        process_txt.process_text_file('mock', 'mock', text_file, directory, output('text_out'), CONCURRENCY)
+        return main.metrics.done
+
+    def absatz():
+        tree = etree.parse(lexicon_file)
+        absatz_in_xml.split_paragraphs(tree.getroot())
+        tree.write(output('absatz_out.xml'), encoding='utf-8', xml_declaration=True)
+
+    def ueberschrift():
+        root = ueberschrift_in_xml.convert_headlines(etree.parse(lexicon_file).getroot())
+        etree.ElementTree(root).write(output('ueberschrift_out.xml'), encoding='utf-8', xml_declaration=True)
+
+    def bibelstellen():
+        tree = bibelstellen_en_de.read_xml_file(lexicon_file)
+        root = bibelstellen_en_de.find_and_translate_bible_elements(tree.getroot(),
+                                                                    bibelstellen_en_de.transl_bibl_en_de)
+        ET.ElementTree(root).write(output('bibel_out.xml'), encoding='utf-8', xml_declaration=True)
+
+    def logos_xml():
+        with open(book_file, 'r', encoding='utf-8') as f:
+            create_logos_xml.write_logos_xml_stream(iter_nodes_from_file(f), output('book_out.xml'))
+
+    def obsidian_md():
+        with open(book_file, 'r', encoding='utf-8') as f:
+            markdown = create_obsidian_md.build_obsidian_md(parse(f.read()))
+        with open(output('book_out.md'), 'w', encoding='utf-8') as f:
+            f.write(markdown)
+
+    paragraph_count = articles * paragraphs
+    return [
+        ('process_xml_paragraph', xml_paragraph, paragraph_count),
+        ('process_xml_article', xml_article, articles),
+        ('process_txt', text, paragraph_count),
+        ('absatz_in_xml', absatz, paragraph_count),
+        ('ueberschrift_in_xml', ueberschrift, paragraph_count),
+        ('bibelstellen_en_de', bibelstellen, paragraph_count),
+        ('create_logos_xml', logos_xml, articles),
+        ('create_obsidian_md', obsidian_md, articles),
+    ]
+
+
+def compare_with_baseline(results, baseline_file=BASELINE_FILE):
+    """Prints the steps that are slower or use more memory than in the baseline; creates it if missing."""
+    if not os.path.exists(baseline_file):
+        os.makedirs(os.path.dirname(baseline_file) or '.', exist_ok=True)
+        with open(baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+        print(f"\nBaseline written to {baseline_file}")
+        return
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {result['stage']: result for result in json.load(f)}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['stage'])
+        # Only runs of the same size and latency are compared
+        if not previous or (previous['units'], previous.get('latency')) != (result['units'], result['latency']):
+            continue
+        if result['seconds'] > max(previous['seconds'] * REGRESSION_FACTOR, MIN_COMPARED_SECONDS):
+            regressions.append(f"{result['stage']}: {previous['seconds']:.2f} s -> {result['seconds']:.2f} s")
+        if result['peak_mib'] > previous['peak_mib'] * REGRESSION_FACTOR:
+            regressions.append(f"{result['stage']}: {previous['peak_mib']:.1f} MiB -> {result['peak_mib']:.1f} MiB")
+    print("\nRegressions against the baseline:" if regressions else "\nNo regressions against the baseline.")
+    for regression in regressions:
+        print("  " + regression)
+
+
+def run_benchmark(articles=ARTICLES, paragraphs=PARAGRAPHS_PER_ARTICLE, latency=MOCK_LATENCY,
+                  baseline_file=BASELINE_FILE):
+    directory = tempfile.mkdtemp(prefix='lectassist_benchmark_')
+    try:
+        lexicon = create_lexicon_xml(articles, paragraphs)
+        lexicon_file = os.path.join(directory, 'lexicon.xml')
+        text_file = os.path.join(directory, 'lexicon.txt')
+        book_file = os.path.join(directory, 'book_WF1234.md')
+        with open(lexicon_file, 'w', encoding='utf-8') as f:
+            f.write(lexicon)
+        with open(text_file, 'w', encoding='utf-8') as f:
+            f.write(create_plain_text(lexicon))
+        with open(book_file, 'w', encoding='utf-8') as f:
+            f.write(create_book(articles, paragraphs))
+
+        main.MOCK_LATENCY = latency
+        main.MIN_REQUEST_INTERVAL = 0  # The rate limit of a provider is not part of the overhead
+        main.QUIET = True
+        main.PROCESS_LOG_FILE = os.path.join(directory, 'benchmark_process.log')
+        listener = main.configure_logging()
+        main.metrics.start()
+
+        print(f"Lexicon: {articles} articles, {articles * paragraphs} paragraphs, {len(lexicon.split())} words; "
+              f"mock latency {latency} s, concurrency {CONCURRENCY}")
+        print(f"{'Stage':<24}{'Seconds':>10}{'Units':>8}{'Units/s':>12}{'Peak MiB':>10}")
+        results = []
+        for name, function, units in stages(directory, lexicon_file, text_file, book_file, articles, paragraphs):
+            result = run_stage(name, function, units)
+            result['latency'] = latency
+            results.append(result)
+            print(f"{name:<24}{result['seconds']:>10.2f}{result['units']:>8}{result['units_per_second']:>12.1f}"
+                  f"{result['peak_mib']:>10.1f}")
+        if listener:
+            listener.stop()
+        logging.shutdown()
+        compare_with_baseline(results, baseline_file)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else ARTICLES,
+                  latency=float(sys.argv[2]) if len(sys.argv) > 2 else MOCK_LATENCY,
+                  baseline_file=sys.argv[3] if len(sys.argv) > 3 else BASELINE_FILE)
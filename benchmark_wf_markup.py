@@ -0,0 +1,124 @@
+'''Misst die Laufzeit von create_logos_xml.py und create_obsidian_md.py für eine Datei in Buchlänge:
+bisherige Verarbeitung mit mehreren regulären Ausdrücken je Ausgabeformat gegen einmaliges Einlesen mit
+wf_markup.parse() und Erzeugen beider Formate aus demselben Dokumentmodell.
+
+Aufruf: python benchmark_wf_markup.py [dateiname_WF1234.md]
+Ohne Dateiname wird ein synthetischer Text in Buchlänge erzeugt.'''
+
+import re
+import sys
+import time
+from lxml import etree
+from wf_markup import parse
+from create_logos_xml import build_logos_xml, xml_header
+from create_obsidian_md import build_obsidian_md
+
+# Size of the synthetic book
+ARTICLES = 400
+PARAGRAPHS_PER_ARTICLE = 12
+REPEATS = 3
+
+pattern_article = re.compile(r'[^\{]\{([^\{\}]+)\}')
+pattern_p_headline = re.compile(r'[^\{]\{\{([^\{\}]+)\}\}')
+pattern_p = re.compile(r'\[\[([^\[\]]+)\]\]')
+pattern_bible = re.compile(r'\{\{\{([^\{\}]+)\}\}\}')
+
+
+def create_book(articles=ARTICLES, paragraphs=PARAGRAPHS_PER_ARTICLE):
+    """Creates a synthetic WF1234 text in book length."""
+    sentence = 'Paulus schreibt der Gemeinde in Rom von der Gerechtigkeit, die vor Gott gilt. '
+    parts = []
+    for a in range(1, articles + 1):
+        parts.append(f'\n{{Kapitel {a} - Warum Paulus nach Rom reisen möchte}}\n\n')
+        parts.append(f'[[{{{{{{Röm. {a % 16 + 1}, 1-17}}}}}}]]\n\n')
+        for p in range(paragraphs):
+            if p % 4 == 0:
+                parts.append(f'{{{{Abschnitt {p}}}}}\n\n')
+            parts.append(f'[[{sentence * 6}Vergleiche {{{{{{Röm. {p + 1}, {a}}}}}}}. {sentence * 2}]]\n\n')
+    return ''.join(parts)
+
+
+def legacy_logos_xml(text):
+    """Former create_logos_xml.py: four regular expressions and a sort per article."""
+    root = etree.fromstring(xml_header)
+    articles_element = etree.SubElement(root, 'articles')
+    matches = list(pattern_article.finditer(text))
+    for i in range(len(matches)):
+        article_element = etree.SubElement(articles_element, 'article', id='A.' + str(i + 1))
+        toc_entry = etree.SubElement(article_element, 'toc-entry', level='2')
+        toc_entry.text = matches[i].group(1).strip()
+        end_pos = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        article_content = text[matches[i].end():end_pos]
+        paragraph_matches = [('headline', m) for m in pattern_p_headline.finditer(article_content)]
+        paragraph_matches += [('paragraph', m) for m in pattern_p.finditer(article_content)]
+        paragraph_matches.sort(key=lambda x: x[1].start())
+        for match_type, para_match in paragraph_matches:
+            para_text = para_match.group(1).strip()
+            if match_type == 'headline':
+                element = etree.SubElement(article_element, 'p', {'field': 'heading', 'class': 'head3'})
+            else:
+                element = etree.SubElement(article_element, 'p')
+            pos, last_node = 0, None
+            for m in pattern_bible.finditer(para_text):
+                if last_node is None:
+                    element.text = para_text[pos:m.start()]
+                else:
+                    last_node.tail = para_text[pos:m.start()]
+                last_node = etree.SubElement(element, 'data', ref=m.group(1).strip())
+                last_node.text = m.group(1).strip()
+                pos = m.end()
+            if last_node is None:
+                element.text = para_text
+            else:
+                last_node.tail = para_text[pos:]
+    return root
+
+
+def legacy_obsidian_md(text):
+    """Former create_obsidian_md.py: four full-text substitutions."""
+    text = pattern_article.sub(lambda m: '\n### ' + m.group(0)[2:-1], text)
+    text = pattern_p_headline.sub(lambda m: '\n#### ' + m.group(0)[3:-2], text)
+    text = pattern_p.sub(lambda m: '' + m.group(0)[2:-2], text)
+    return pattern_bible.sub(lambda m: '[[' + m.group(0)[3:-3] + ']]', text)
+
+
+def measure(function, *args):
+    """Returns the best time of REPEATS runs in seconds and the result of the last run."""
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function(*args)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best, result
+
+
+def single_pass(text):
+    nodes = parse(text)
+    return build_logos_xml(nodes), build_obsidian_md(nodes)
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as datei:
+            text = datei.read()
+    else:
+        text = create_book()
+    print(f"Text: {len(text)} characters, {len(text.split())} words")
+
+    legacy_xml_time, legacy_root = measure(legacy_logos_xml, text)
+    legacy_md_time, legacy_md = measure(legacy_obsidian_md, text)
+    parse_time, _ = measure(parse, text)
+    single_time, (root, md) = measure(single_pass, text)
+
+    print(f"Legacy Logos XML:      {legacy_xml_time:8.3f} s")
+    print(f"Legacy Obsidian MD:    {legacy_md_time:8.3f} s")
+    print(f"Legacy total:          {legacy_xml_time + legacy_md_time:8.3f} s")
+    print(f"wf_markup.parse():     {parse_time:8.3f} s")
+    print(f"Single pass, both:     {single_time:8.3f} s")
+    print(f"Same Logos XML:        {etree.tostring(root) == etree.tostring(legacy_root)}")
+    print(f"Same Obsidian MD:      {md == legacy_md}")
+
+
+if __name__ == "__main__":
+    main()
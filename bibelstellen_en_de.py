@@ -3,6 +3,7 @@ im Logos xml-Format.'''
 
 import xml.etree.ElementTree as ET
 import os
+from profiling import configure_profiling, profile_stage
 
 # Input filename
 INPUT_FILENAME = 'CalwerFULL_241009_out.xml'
@@ -14,6 +15,10 @@ OUTPUT_TXT_PATH = 'C:/Users/Fried/documents/LectorAssistant/logos_tags/bearbeite
 INPUT_FILE = os.path.join(DIRECTORY_PATH, INPUT_FILENAME)
 OUTPUT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_TransBiblEnDe.xml')
 
+# Profile the stages with cProfile / tracemalloc; reports are written next to OUTPUT_FILE
+PROFILE = False
+PROFILE_MEMORY = False
+
 transl_bibl_en_de = {
     "Bible:Ge": "1Mos.",
     "Bible:Ex": "2Mos.",
@@ -267,13 +272,17 @@ def find_and_translate_bible_elements(root, transl_bibl_en_de):
 def main():
     """Main function to run the script."""
 
+    configure_profiling(OUTPUT_FILE, PROFILE, PROFILE_MEMORY)
+
     # Step 1: Read xml-file
-    tree = read_xml_file(INPUT_FILE)
+    with profile_stage('parse_input'):
+        tree = read_xml_file(INPUT_FILE)
 
     # Step 2: Finden und Drucken der gewünschten XML-Elemente
     root = tree.getroot()
     print(root)
-    root = find_and_translate_bible_elements(root, transl_bibl_en_de)
+    with profile_stage('translate_bible_refs'):
+        root = find_and_translate_bible_elements(root, transl_bibl_en_de)
 
     # Step 3: Ensure output directory exists
     output_dir = os.path.dirname(OUTPUT_FILE)
@@ -283,7 +292,7 @@ def main():
     print(f"Start writing the processed XML file to: {OUTPUT_FILE}")
 
     new_tree = ET.ElementTree(root)
-    with open(OUTPUT_FILE, 'wb') as file:
+    with profile_stage('write_output'), open(OUTPUT_FILE, 'wb') as file:
         new_tree.write(file, encoding='utf-8', xml_declaration=True)
 
     print(f"Processed XML file written to: {OUTPUT_FILE}")
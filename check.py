@@ -8,21 +8,22 @@ Text, der im ausgegebenen Text (rechtes Fenster) ergänzt wurde, wird in grüner
 
 import tkinter as tk
 from tkinter import filedialog, scrolledtext
-import json
-import nltk
-from nltk.tokenize import word_tokenize
-import difflib
-import re
-
-nltk.download('punkt')
+from log_index import LogIndex
+from log_search import LogSearch, MIN_QUERY_LENGTH
+from word_diff import DiffCache
 
 class LogViewer:
     def __init__(self, master):
         self.master = master
         self.master.title("Log Viewer")
-        self.records = []
+        self.records = None  # LogIndex of the opened log file
+        self.search_index = None  # LogSearch of the opened log file
+        self.hits = []  # Positions of the records found by the last search
+        self.hit_index = 0
+        self.last_search = None
         self.current_index = 0
         self.file_path = None
+        self.diffs = DiffCache()
 
         self.create_widgets()
         self.load_file()
@@ -35,11 +36,16 @@ class LogViewer:
         # ID Input Field
         self.id_input_frame = tk.Frame(self.master)
         self.id_input_frame.pack(fill=tk.X)
-        self.id_input_label = tk.Label(self.id_input_frame, text="Enter ID:")
+        self.id_input_label = tk.Label(self.id_input_frame, text="Enter ID or text:")
         self.id_input_label.pack(side=tk.LEFT)
         self.id_input = tk.Entry(self.id_input_frame)
         self.id_input.pack(side=tk.LEFT, expand=True, fill=tk.X)
         self.id_input.bind('<Return>', self.search_id)
+        self.status_filter = tk.StringVar(value="all")
+        self.status_menu = tk.OptionMenu(self.id_input_frame, self.status_filter, "all", "success", "error")
+        self.status_menu.pack(side=tk.LEFT)
+        self.hit_label = tk.Label(self.id_input_frame, text="")
+        self.hit_label.pack(side=tk.LEFT)
 
         # Info labels
         self.info_frame = tk.Frame(self.master)
@@ -82,95 +88,85 @@ class LogViewer:
     def load_file(self):
         self.file_path = filedialog.askopenfilename(filetypes=[("Log files", "*.log")])
         if self.file_path:
-            with open(self.file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                self.records = []
-                for line in content.strip().split('\n'):
-                    try:
-                        parts = line.split(' - ', 1)
-                        if len(parts) == 2:
-                            record = json.loads(parts[1])
-                            self.records.append(record)
-                    except json.JSONDecodeError:
-                        print(f"Fehler beim Parsen der Zeile: {line}")
-                    except IndexError:
-                        print(f"Ungültiges Zeilenformat: {line}")
-            if self.records:
+            # Records are decoded only when they are displayed
+            self.records = LogIndex(self.file_path)
+            # The search index is built in the background, the first record is shown at once
+            self.search_index = LogSearch(self.records)
+            self.search_index.update_in_background()
+            if len(self.records):
                 self.display_record()
             else:
                 print("Keine gültigen Datensätze gefunden.")
 
     def search_id(self, event):
-        search_id = self.id_input.get()
-        for i, record in enumerate(self.records):
-            if record['id'] == search_id:
-                self.current_index = i
-                self.display_record()
-                self.error_label.config(text="")
-                return
-        self.error_label.config(text="Keine übereinstimmende ID gefunden.")
+        """
+        Searches the entered ID, or else the entered text in content and response, filtered by status.
+        Pressing Enter again with the same search jumps to the next hit.
+        """
+        if self.search_index is None:
+            return
+        query = self.id_input.get().strip()
+        status = None if self.status_filter.get() == "all" else self.status_filter.get()
+        if (query, status) == self.last_search and self.hits:
+            self.hit_index = (self.hit_index + 1) % len(self.hits)
+        else:
+            self.records.refresh()
+            self.search_index.update_in_background()
+            self.hits = self.search_index.lookup_id(query, status) if query else []
+            if not self.hits:
+                self.hits = self.search_index.search(query, status)
+            self.hit_index = 0
+            self.last_search = (query, status)
+        if not self.hits:
+            if query and len(query) < MIN_QUERY_LENGTH:
+                self.error_label.config(text=f"Textsuche ab {MIN_QUERY_LENGTH} Zeichen.")
+            elif self.search_index.building():
+                self.error_label.config(text=f"Nicht gefunden, der Suchindex wird noch aufgebaut "
+                                             f"({self.search_index.indexed()} von {len(self.records)} Datensätzen).")
+            else:
+                self.error_label.config(text="Keine übereinstimmende ID oder Text gefunden.")
+            self.hit_label.config(text="")
+            return
+        self.current_index = self.hits[self.hit_index]
+        self.display_record()
+        self.error_label.config(text="")
+        pending = " (Suchindex wird noch aufgebaut)" if self.search_index.building() else ""
+        self.hit_label.config(text=f"Treffer {self.hit_index + 1} von {len(self.hits)}{pending}")
 
     def display_record(self):
         if self.records:
-            record = self.records[self.current_index]
-            self.id_label.config(text=f"ID: {record['id']}")
+            record = self.records.record(self.current_index)
+            if record is None:
+                self.error_label.config(text="Datensatz konnte nicht gelesen werden.")
+                return
+            self.id_label.config(text=f"ID: {record.get('id', record.get('chunk_id'))}")
             self.status_label.config(text=f"Status: {record['status']}")
             self.message_label.config(text=f"Message: {record['message']}")
 
             self.left_text.delete('1.0', tk.END)
             self.right_text.delete('1.0', tk.END)
 
-            marked_content, marked_response = self.compare_texts(record['content'], record['response'])
-
-            self.insert_colored_text(self.left_text, marked_content, 'red')
-            self.insert_colored_text(self.right_text, marked_response, 'green')
-
-    def compare_texts(self, text1, text2):
-        tokens1 = self.tokenize_with_whitespace(text1)
-        tokens2 = self.tokenize_with_whitespace(text2)
-
-        d = difflib.Differ()
-        diff = list(d.compare(tokens1, tokens2))
-
-        marked_text1 = []
-        marked_text2 = []
-
-        for token in diff:
-            if token.startswith('  '):
-                marked_text1.append(token[2:])
-                marked_text2.append(token[2:])
-            elif token.startswith('- '):
-                marked_text1.append(f"[{token[2:]}]")
-            elif token.startswith('+ '):
-                marked_text2.append(f"[{token[2:]}]")
-
-        return ''.join(marked_text1), ''.join(marked_text2)
-
-    def tokenize_with_whitespace(self, text):
-        words = word_tokenize(text)
-        tokens = []
-        last_end = 0
-        for word in words:
-            try:
-                start = text.index(word, last_end)
-                end = start + len(word)
-                if start > last_end:
-                    tokens.append((' ' * (start - last_end)))
-                tokens.append((word))
-                last_end = end
-            except ValueError:
-                # Wenn das Wort nicht gefunden wird, fügen Sie es einfach hinzu
-                tokens.append((word))
-                last_end += len(word)
-        return tokens
-
-    def insert_colored_text(self, text_widget, text, color):
-        parts = re.split(r'(\[.*?\])', text)
-        for part in parts:
-            if part.startswith('[') and part.endswith(']'):
-                text_widget.insert(tk.END, part[1:-1], color)
-            else:
-                text_widget.insert(tk.END, part)
+            content, response = record['content'], record['response']
+            removed, added = self.diffs.get(self.current_index, content, response)
+
+            self.insert_colored_text(self.left_text, content, removed, 'red')
+            self.insert_colored_text(self.right_text, response, added, 'green')
+
+            self.prefetch_neighbours()
+
+    def prefetch_neighbours(self):
+        """Computes the diffs of the previous and the next record in the background."""
+        for index in (self.current_index + 1, self.current_index - 1):
+            if 0 <= index < len(self.records):
+                record = self.records.record(index)
+                if record:
+                    self.diffs.prefetch(index, record['content'], record['response'])
+
+    def insert_colored_text(self, text_widget, text, spans, color):
+        # Insert the text at once and color the changed ranges afterwards
+        text_widget.insert(tk.END, text)
+        for start, end in spans:
+            text_widget.tag_add(color, f"1.0 + {start} chars", f"1.0 + {end} chars")
         text_widget.tag_configure('red', foreground='red')
         text_widget.tag_configure('green', foreground='green')
 
@@ -180,7 +176,10 @@ class LogViewer:
             self.display_record()
 
     def next_record(self):
-        if self.current_index < len(self.records) - 1:
+        if self.records is not None:
+            # Lines appended by a running process become visible
+            self.records.refresh()
+        if self.records and self.current_index < len(self.records) - 1:
             self.current_index += 1
             self.display_record()
 
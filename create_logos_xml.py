@@ -1,6 +1,8 @@
 import os
+import time
 from lxml import etree
-import re
+from wf_markup import parse, iter_nodes_from_file, iter_articles, Paragraph, Bible
+from profiling import configure_profiling, profile_stage
 
 
 # Input filename
@@ -12,9 +14,18 @@ FINISHED_PATH = 'C:/Users/Fried/documents/LectorAssistant/Schlatter/Der_Roemerbr
 OUTPUT_TXT_PATH = 'C:/Users/Fried/documents/LectorAssistant/bearbeitet_txt/'
 INPUT_FILE = os.path.join(DIRECTORY_PATH, INPUT_FILENAME)
 OUTPUT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'5.xml')
+OBSIDIAN_OUTPUT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'5.md')
 
-with open(INPUT_FILE, 'r', encoding='utf-8') as datei:
-    text = datei.read()
+# Also create the Obsidian Markdown file (create_obsidian_md.py) from the same parse
+WRITE_OBSIDIAN_MD = False
+
+# Write each article to the file as soon as it is parsed instead of building and printing the whole tree
+STREAM_XML = True
+PROGRESS_EVERY = 100  # Number of written articles between two progress lines
+
+# Profile the stages with cProfile / tracemalloc; reports are written next to OUTPUT_FILE
+PROFILE = False
+PROFILE_MEMORY = False
 
 
 
@@ -51,117 +62,133 @@ xml_header = '''<logos-resource-content xmlns:xsi=
         "http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation="X:\\Schema\\content.xsd">
         </logos-resource-content>'''
 
-# Create the root element
-# Parse the XML header and get the root element
-root = etree.fromstring(xml_header)
-
-# Create the 'articles' element
-articles_element = etree.SubElement(root, 'articles')
-
-# Regular expression patterns
-pattern_article = re.compile(r'[^\{]\{([^\{\}]+)\}')
-pattern_p_headline = re.compile(r'[^\{]\{\{([^\{\}]+)\}\}')
-pattern_p = re.compile(r'\[\[([^\[\]]+)\]\]')
-pattern_bible = re.compile(r'\{\{\{([^\{\}]+)\}\}\}')
 
-# Find articles
-matches = list(pattern_article.finditer(text))
+def process_para_text(segments, parent_element):
+    """Adds the text of a paragraph or headline to parent_element, Bible references become <data> elements."""
+    segments = list(segments)
+    # Strip the paragraph text as a whole
+    if segments and isinstance(segments[0], str):
+        segments[0] = segments[0].lstrip()
+    if segments and isinstance(segments[-1], str):
+        segments[-1] = segments[-1].rstrip()
 
-# Initialize the article counter
-article_count = 1
-
-for i in range(len(matches)):
-    article_title = matches[i].group(1).strip()
+    last_node = None
+    for segment in segments:
+        if isinstance(segment, Bible):
+            # Create the 'data' element
+            last_node = etree.SubElement(parent_element, 'data', ref=segment.ref.strip())
+            last_node.text = segment.ref.strip()
+        elif last_node is None:
+            parent_element.text = (parent_element.text or '') + segment
+        else:
+            last_node.tail = (last_node.tail or '') + segment
 
-    # Set the article_id to 'A.' followed by the counter
-    article_id = 'A.' + str(article_count)
 
+def build_article(article, article_id):
+    """Creates the 'article' element of one article of the document model."""
     # Create an 'article' element with the 'id' attribute
-    article_element = etree.SubElement(articles_element, 'article', id=article_id)
+    article_element = etree.Element('article', id=article_id)
 
     # Create the 'toc-entry' element as a child of 'article_element'
     toc_entry = etree.SubElement(article_element, 'toc-entry', level='2')
-    toc_entry.text = article_title
-
-    # Get the content between the current and next article
-    start_pos = matches[i].end()
-    if i + 1 < len(matches):
-        end_pos = matches[i + 1].start()
-    else:
-        end_pos = len(text)
-    article_content = text[start_pos:end_pos]
-
-    # Find paragraph headlines and paragraphs within the article_content
-    paragraph_matches = []
-    for match in pattern_p_headline.finditer(article_content):
-        paragraph_matches.append(('headline', match))
-    for match in pattern_p.finditer(article_content):
-        paragraph_matches.append(('paragraph', match))
-    # Sort matches in order of their occurrence
-    paragraph_matches.sort(key=lambda x: x[1].start())
-
-    # Define the function to process paragraph text
-    def process_para_text(para_text, parent_element):
-        # Process para_text, adding content to parent_element
-        pos = 0
-        # Find all matches
-        matches = list(pattern_bible.finditer(para_text))
-        # If no matches
-        if not matches:
-            parent_element.text = para_text
-            return
-        # Else, we have matches
-        last_node = None
-        for m in matches:
-            # Text before the match
-            pre_text = para_text[pos:m.start()]
-            if last_node is None:
-                # First segment
-                parent_element.text = pre_text
-            else:
-                last_node.tail = pre_text
-            # Create the 'data' element
-            data_element = etree.SubElement(parent_element, 'data', ref=m.group(1).strip())
-            data_element.text = m.group(1).strip()
-            # Update pos
-            pos = m.end()
-            # Keep track of last node
-            last_node = data_element
-        # Add the remaining text after the last match
-        remaining_text = para_text[pos:]
-        if last_node is not None:
-            last_node.tail = remaining_text
-
-    # For each paragraph match, create an element
-    for match_type, para_match in paragraph_matches:
-        para_text = para_match.group(1).strip()
-        if match_type == 'headline':
-            # Create a 'headline' element under 'article'
-            headline_element = etree.SubElement(article_element, 'p', field='heading', class_='head3')
-            # Process para_text for pattern_bible matches
-            process_para_text(para_text, headline_element)
-        elif match_type == 'paragraph':
+    toc_entry.text = article.title.strip()
+
+    for block in article.blocks:
+        if isinstance(block, Paragraph):
             # Create a 'p' element under 'article'
             p_element = etree.SubElement(article_element, 'p')
-            # Process para_text for pattern_bible matches
-            process_para_text(para_text, p_element)
-
-        elif match_type == 'paragraph':
-            # Create a 'p' element under 'article' with style attribute
-            style_string = create_style_string()
-            p_element = etree.SubElement(article_element, 'p', style=style_string)
-            # Process para_text for pattern_bible matches
-            process_para_text(para_text, p_element)
-
+            process_para_text(block.segments, p_element)
+        else:
+            # Create a 'headline' element under 'article'
+            headline_element = etree.SubElement(article_element, 'p', {'field': 'heading', 'class': 'head3'})
+            process_para_text([block.text], headline_element)
+    return article_element
 
-    # Increment the article counter
-    article_count += 1
 
-# Print the resulting XML structure
-print(etree.tostring(root, pretty_print=True, encoding='unicode'))
+def build_logos_xml(nodes):
+    """Creates the Logos XML tree from the nodes of wf_markup.parse()."""
+    # Parse the XML header and get the root element
+    root = etree.fromstring(xml_header)
 
-# Aktualisierte XML-Struktur in einer neuen Datei speichern
-tree = etree.ElementTree(root)
-tree.write(OUTPUT_FILE, encoding='utf-8', xml_declaration=True)
+    # Create the 'articles' element
+    articles_element = etree.SubElement(root, 'articles')
 
-print(f"XML file has been processed successfully: {OUTPUT_FILE}")
\ No newline at end of file
+    # Set the article_id to 'A.' followed by the counter
+    for article_count, article in enumerate(iter_articles(nodes), start=1):
+        articles_element.append(build_article(article, 'A.' + str(article_count)))
+    return root
+
+
+def write_logos_xml_stream(nodes, output_file):
+    """
+    Writes the Logos XML file article by article with an incremental XML writer,
+    so that only one article is held in memory.
+
+    Returns:
+    dict: Number of written articles, paragraphs, headlines and Bible references.
+    """
+    header = etree.fromstring(xml_header)
+    stats = {'articles': 0, 'paragraphs': 0, 'headlines': 0, 'bible_refs': 0}
+    with etree.xmlfile(output_file, encoding='utf-8') as xf:
+        xf.write_declaration()
+        with xf.element(header.tag, header.attrib, nsmap=header.nsmap):
+            with xf.element('articles'):
+                for article_count, article in enumerate(iter_articles(nodes), start=1):
+                    article_element = build_article(article, 'A.' + str(article_count))
+                    xf.write(article_element)
+                    stats['articles'] += 1
+                    headlines = len(article_element.findall('p[@field="heading"]'))
+                    stats['headlines'] += headlines
+                    stats['paragraphs'] += len(article_element.findall('p')) - headlines
+                    stats['bible_refs'] += len(article_element.findall('.//data'))
+                    if article_count % PROGRESS_EVERY == 0:
+                        print(f"{article_count} articles written ...")
+    return stats
+
+
+def main():
+    configure_profiling(OUTPUT_FILE, PROFILE, PROFILE_MEMORY)
+
+    if STREAM_XML:
+        start = time.perf_counter()
+        with open(INPUT_FILE, 'r', encoding='utf-8') as datei:
+            # The file is read in blocks; keep the nodes only if a second output format needs them
+            nodes = iter_nodes_from_file(datei)
+            if WRITE_OBSIDIAN_MD:
+                nodes = list(nodes)
+            # Reading, parsing and writing are interleaved when the nodes are streamed
+            with profile_stage('write_logos_xml'):
+                stats = write_logos_xml_stream(nodes, OUTPUT_FILE)
+        print(f"{stats['articles']} articles, {stats['paragraphs']} paragraphs, {stats['headlines']} headlines "
+              f"and {stats['bible_refs']} Bible references written in {time.perf_counter() - start:.1f} s")
+        print(f"XML file has been processed successfully: {OUTPUT_FILE}")
+        if WRITE_OBSIDIAN_MD:
+            from create_obsidian_md import build_obsidian_md, save_as_md
+            save_as_md(build_obsidian_md(nodes), OBSIDIAN_OUTPUT_FILE)
+        return
+
+    with open(INPUT_FILE, 'r', encoding='utf-8') as datei:
+        text = datei.read()
+
+    # Parse the markup once for all output formats
+    with profile_stage('parse_markup'):
+        nodes = parse(text)
+    with profile_stage('build_logos_xml'):
+        root = build_logos_xml(nodes)
+
+    # Print the resulting XML structure
+    print(etree.tostring(root, pretty_print=True, encoding='unicode'))
+
+    # Aktualisierte XML-Struktur in einer neuen Datei speichern
+    tree = etree.ElementTree(root)
+    tree.write(OUTPUT_FILE, encoding='utf-8', xml_declaration=True)
+
+    print(f"XML file has been processed successfully: {OUTPUT_FILE}")
+
+    if WRITE_OBSIDIAN_MD:
+        from create_obsidian_md import build_obsidian_md, save_as_md
+        save_as_md(build_obsidian_md(nodes), OBSIDIAN_OUTPUT_FILE)
+
+
+if __name__ == "__main__":
+    main()
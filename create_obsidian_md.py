@@ -1,5 +1,9 @@
 import os
 import re
+import json
+import hashlib
+from wf_markup import parse, Article, Headline, Paragraph, Bible
+from profiling import configure_profiling, profile_stage
 
 
 # Input filename
@@ -12,8 +16,16 @@ OUTPUT_TXT_PATH = 'C:/Users/Fried/documents/LectorAssistant/bearbeitet_txt/'
 INPUT_FILE = os.path.join(DIRECTORY_PATH, INPUT_FILENAME)
 OUTPUT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'5.md')
 
-with open(INPUT_FILE, 'r', encoding='utf-8') as datei:
-    text = datei.read()
+# Export one note per {...} article into an Obsidian vault instead of one Markdown file
+VAULT_EXPORT = False
+VAULT_DIRECTORY = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_vault')
+VAULT_MANIFEST = '.vault_manifest.json'  # Content hashes of the exported notes
+INDEX_NOTE = '00 Inhaltsverzeichnis'  # Note linking all articles in the order of the book
+FRONT_NOTE = '00 Vorspann'  # Note for text before the first article
+
+# Profile the stages with cProfile / tracemalloc; reports are written next to OUTPUT_FILE
+PROFILE = False
+PROFILE_MEMORY = False
 
 
 
@@ -65,20 +77,127 @@ def save_as_md(text, filename):
 
 
 
-# Reguläre Ausdrucksmuster
-pattern_article = re.compile(r'[^\{]\{([^\{\}]+)\}')
-pattern_p_headline = re.compile(r'[^\{]\{\{([^\{\}]+)\}\}')
-pattern_p = re.compile(r'\[\[([^\[\]]+)\]\]')
-pattern_bible = re.compile(r'\{\{\{([^\{\}]+)\}\}\}')
-
-# Zeilenumbrüche vor den Artikeln einfügen und keine XML-Elemente dafür erstellen
-# Füge vor jedem match von pattern_article einen Zeilenumbruch ein
-text = pattern_article.sub(lambda m: '\n### ' + m.group(0)[2:-1], text)
-text = pattern_p_headline.sub(lambda m: '\n#### ' + m.group(0)[3:-2], text)
-text = pattern_p.sub(lambda m: '' + m.group(0)[2:-2], text)
-text = pattern_bible.sub(lambda m: '[[' + m.group(0)[3:-3] + ']]', text)
-
-print(text)
-
-# Save response as MD-file
-save_as_md(text, OUTPUT_FILE)
\ No newline at end of file
+def build_obsidian_md(nodes):
+    """Creates the Obsidian Markdown text from the nodes of wf_markup.parse()."""
+    parts = []
+    for node in nodes:
+        if isinstance(node, (Article, Headline)):
+            # Zeilenumbruch vor den Überschriften einfügen; er ersetzt den Zeilenumbruch davor
+            if parts and parts[-1].endswith('\n'):
+                parts[-1] = parts[-1][:-1]
+            parts.append(('\n### ' if isinstance(node, Article) else '\n#### ') + node[0])
+        elif isinstance(node, Paragraph):
+            parts.extend(f'[[{segment.ref}]]' if isinstance(segment, Bible) else segment
+                         for segment in node.segments)
+        elif isinstance(node, Bible):
+            parts.append(f'[[{node.ref}]]')
+        else:
+            parts.append(node.text)
+    return ''.join(parts)
+
+
+def note_name(title):
+    """Returns a file name for the note of an article title."""
+    name = re.sub(r'[\\/:*?"<>|#^\[\]]', '', title)
+    return ' '.join(name.split())[:100] or 'Ohne Titel'
+
+
+def build_vault_notes(nodes):
+    """
+    Splits the nodes into one note per article.
+
+    Returns:
+    dict: Note file names mapped to their Markdown content, in the order of the book.
+    """
+    groups = [(FRONT_NOTE, [])]
+    for node in nodes:
+        if isinstance(node, Article):
+            groups.append((note_name(node.title), []))
+        groups[-1][1].append(node)
+
+    notes, links = {}, []
+    for name, group in groups:
+        content = build_obsidian_md(group).strip()
+        if not content:
+            continue
+        # Articles with the same title get a counter
+        unique_name, counter = name, 2
+        while unique_name + '.md' in notes:
+            unique_name = f"{name} ({counter})"
+            counter += 1
+        notes[unique_name + '.md'] = content + '\n'
+        links.append(f"- [[{unique_name}]]")
+    notes[INDEX_NOTE + '.md'] = '\n'.join(links) + '\n'
+    return notes
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def export_vault(nodes, vault_directory):
+    """
+    Writes one note per article into vault_directory. Notes whose content did not change since the
+    last export are not touched, notes of removed articles are deleted.
+
+    Returns:
+    dict: Number of written, unchanged and removed notes.
+    """
+    os.makedirs(vault_directory, exist_ok=True)
+    manifest_file = os.path.join(vault_directory, VAULT_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    stats = {'written': 0, 'unchanged': 0, 'removed': 0}
+    new_manifest = {}
+    for filename, content in build_vault_notes(nodes).items():
+        digest = content_hash(content)
+        new_manifest[filename] = digest
+        path = os.path.join(vault_directory, filename)
+        if manifest.get(filename) == digest and os.path.exists(path):
+            stats['unchanged'] += 1
+            continue
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        stats['written'] += 1
+
+    # Only notes created by an earlier export are removed
+    for filename in manifest.keys() - new_manifest.keys():
+        path = os.path.join(vault_directory, filename)
+        if os.path.exists(path):
+            os.remove(path)
+            stats['removed'] += 1
+
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(new_manifest, f, ensure_ascii=False, indent=1)
+    return stats
+
+
+def main():
+    configure_profiling(OUTPUT_FILE, PROFILE, PROFILE_MEMORY)
+    with open(INPUT_FILE, 'r', encoding='utf-8') as datei:
+        text = datei.read()
+
+    with profile_stage('parse_markup'):
+        nodes = parse(text)
+
+    if VAULT_EXPORT:
+        with profile_stage('export_vault'):
+            stats = export_vault(nodes, VAULT_DIRECTORY)
+        print(f"Vault exported to {VAULT_DIRECTORY}: {stats['written']} notes written, "
+              f"{stats['unchanged']} unchanged, {stats['removed']} removed")
+        return
+
+    with profile_stage('build_obsidian_md'):
+        text = build_obsidian_md(nodes)
+
+    print(text)
+
+    # Save response as MD-file
+    save_as_md(text, OUTPUT_FILE)
+
+
+if __name__ == "__main__":
+    main()
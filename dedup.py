@@ -0,0 +1,195 @@
+'''Erkennt doppelte Einheiten (Absätze bzw. Textabschnitte), bevor sie an das LLM gehen. Gleiche Einheiten
+(gleicher Inhalt bis auf Leerzeichen) werden nur einmal gesendet; die Antwort gilt auch für alle Kopien.
+Fast gleiche Einheiten (z.B. Verweisartikel oder wiederkehrende Formeln mit anderem Namen) werden über
+MinHash-Signaturen und Locality-Sensitive Hashing gefunden und nur berichtet, da ihre Antworten sich
+unterscheiden müssen. Der Bericht steht in der Konsole und in der _dedup.txt-Datei neben der Ausgabedatei.
+Eine übernommene Antwort wird in der _process.log-Datei mit der Route der ursprünglichen Anfrage ("provider") und
+der Einheit, von der sie stammt ("dedup_of"), protokolliert.'''
+
+import re
+import hashlib
+import threading
+from concurrent.futures import Future
+from collections import defaultdict
+import numpy as np
+from main import serving, served_by
+from rerun_failed import is_failed
+
+SHINGLE_SIZE = 3  # Words per shingle
+NUM_PERMUTATIONS = 64  # Length of the MinHash signature
+BANDS = 16  # LSH bands of NUM_PERMUTATIONS / BANDS rows; candidates share at least one band
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Estimated Jaccard similarity from which units count as near-duplicates
+MIN_SHINGLES = 5  # Shorter units are not compared for near-duplicates
+REPORTED_CLUSTERS = 50  # Clusters listed in the report file
+
+MERSENNE_PRIME = (1 << 61) - 1
+permutation_seeds = np.random.default_rng(1).integers(1, MERSENNE_PRIME, size=(2, NUM_PERMUTATIONS),
+                                                       dtype=np.uint64)
+
+
+def normalize(text):
+    return ' '.join(text.split())
+
+
+def fingerprint(text):
+    """Returns the key of exact duplicates: the hash of the text with normalized whitespace."""
+    return hashlib.blake2b(normalize(text).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def shingles(text):
+    words = re.sub(r'<[^>]+>', ' ', text).lower().split()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(0, len(words) - SHINGLE_SIZE + 1))}
+
+
+def minhash(shingle_set):
+    """Returns the MinHash signature of a set of shingles as an array of NUM_PERMUTATIONS values."""
+    hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=7).digest(), 'little')
+                       for s in shingle_set], dtype=np.uint64)
+    a, b = permutation_seeds
+    # (a * x + b) mod p on 64 bits; the overflow of the product is part of the hash function
+    permuted = (np.outer(hashes, a) + b) % MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+def near_duplicate_clusters(texts):
+    """
+    Groups texts whose estimated Jaccard similarity is at least NEAR_DUPLICATE_THRESHOLD. Exact duplicates
+    are represented by their first occurrence.
+
+    Args:
+    texts (list): The units as strings.
+
+    Returns:
+    list: Clusters as lists of indices into texts, each with at least two different texts.
+    """
+    signatures = {}
+    seen = set()
+    for index, text in enumerate(texts):
+        key = fingerprint(text)
+        if key in seen:
+            continue
+        seen.add(key)
+        shingle_set = shingles(text)
+        if len(shingle_set) >= MIN_SHINGLES:
+            signatures[index] = minhash(shingle_set)
+
+    rows = NUM_PERMUTATIONS // BANDS
+    buckets = defaultdict(list)
+    for index, signature in signatures.items():
+        for band in range(BANDS):
+            buckets[(band, signature[band * rows:(band + 1) * rows].tobytes())].append(index)
+
+    parent = {index: index for index in signatures}
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    compared = set()
+    for members in buckets.values():
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                # Pairs already in one cluster or compared in another band are skipped
+                if find(first) == find(second) or (first, second) in compared:
+                    continue
+                compared.add((first, second))
+                similarity = np.count_nonzero(signatures[first] == signatures[second]) / NUM_PERMUTATIONS
+                if similarity >= NEAR_DUPLICATE_THRESHOLD:
+                    parent[find(second)] = find(first)
+
+    clusters = defaultdict(list)
+    for index in signatures:
+        clusters[find(index)].append(index)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def reusable(response):
+    """Empty responses and exception messages (see rerun_failed.is_failed) are not shared."""
+    return bool(response) and not is_failed({'response': response})
+
+
+class Deduplicator:
+    """
+    Sends each unit once per run and shares its response with the exact duplicates, also with those that are
+    processed at the same time by another thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.futures = {}  # fingerprint -> Future of (response, provider, unit) of the first occurrence
+        self.units = 0
+        self.reused = 0
+
+    def run(self, text, compute, valid=reusable, unit=None):
+        """
+        Returns the response for `text`, calling compute() only for the first of its exact duplicates. For a
+        reused response, main.serving.provider is set to the route that answered the first occurrence and
+        main.serving.dedup_of to its unit.
+
+        Args:
+        text (str): The unit sent to the LLM.
+        compute: Function without arguments that returns the response.
+        valid: Predicate for responses that may be reused; an invalid response is computed again.
+        unit: Name of the unit in the process log, e.g. its article or chunk id.
+
+        Returns:
+        tuple: (response, reused).
+        """
+        serving.dedup_of = None
+        key = fingerprint(text)
+        with self.lock:
+            self.units += 1
+            future = self.futures.get(key)
+            owner = future is None
+            if owner:
+                future = self.futures[key] = Future()
+        if not owner:
+            response, provider, original = future.result()
+            if valid(response):
+                with self.lock:
+                    self.reused += 1
+                serving.provider = provider
+                serving.dedup_of = original
+                return response, True
+            return compute(), False
+        try:
+            response = compute()
+        except BaseException as e:
+            with self.lock:
+                del self.futures[key]
+            future.set_exception(e)
+            raise
+        if not valid(response):
+            with self.lock:
+                del self.futures[key]
+        future.set_result((response, served_by(), unit))
+        return response, False
+
+
+def report(texts, deduplicator, report_file):
+    """
+    Prints the calls saved by the deduplicator and the near-duplicates of the units, and writes the
+    near-duplicate clusters to report_file.
+
+    Args:
+    texts (list): The units that were checked.
+    deduplicator (Deduplicator): The deduplicator used for the run.
+    report_file (str): Path of the _dedup.txt file.
+    """
+    clusters = near_duplicate_clusters(texts)
+    near_units = sum(len(members) for members in clusters)
+    lines = [
+        f"Units: {deduplicator.units}, calls saved by exact duplicates: {deduplicator.reused}",
+        f"Near-duplicates (similarity >= {NEAR_DUPLICATE_THRESHOLD}): {len(clusters)} clusters with "
+        f"{near_units} units, {near_units - len(clusters)} calls could be saved (sent individually)",
+    ]
+    print("\n--- Deduplication ---\n" + "\n".join(lines) + "\n---------------------")
+    clusters.sort(key=len, reverse=True)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+        for number, members in enumerate(clusters[:REPORTED_CLUSTERS], start=1):
+            f.write(f"\nCluster {number} ({len(members)} units):\n")
+            for index in members:
+                f.write(f"  [{index}] {normalize(texts[index])[:200]}\n")
@@ -0,0 +1,84 @@
+'''Inkrementelle Verarbeitung eines neu exportierten Lexikons. Der Checkpoint (_check.json) speichert je Artikel
+den Hash seines Eingabe-XML ("input") und seines bearbeiteten Textes ("output"). Bei einem erneuten Lauf wird
+jeder Artikel der Eingabedatei damit verglichen:
+- unverändert: der bearbeitete Artikel wird aus der vorhandenen Ausgabedatei übernommen,
+- bereits bearbeitet (die Eingabedatei ist eine frühere _out.xml-Datei): der Artikel bleibt, wie er ist,
+- neu oder geändert: der Artikel wird an das LLM gesendet.
+Ältere Checkpoints mit "id": true werden wie bisher behandelt: der Artikel wird übersprungen.'''
+
+import os
+from collections import Counter
+import xml.etree.ElementTree as ET
+from main import print_progress
+from dedup import fingerprint
+from scheduling import adopt
+
+
+def input_hash(article):
+    """Hash of the article XML before processing, insensitive to whitespace."""
+    return fingerprint(ET.tostring(article, encoding='unicode'))
+
+
+def output_hash(article):
+    """Hash of the text of the processed article; wrapper elements added during processing do not count."""
+    return fingerprint(''.join(article.itertext()))
+
+
+def load_previous_output(output_file):
+    """Returns the articles of an existing output file by id, or an empty dict."""
+    if not os.path.exists(output_file):
+        return {}
+    try:
+        root = ET.parse(output_file, parser=ET.XMLParser(encoding="utf-8")).getroot()
+    except ET.ParseError as e:
+        print(f"Previous output {output_file} cannot be read, processed articles are not copied: {e}")
+        return {}
+    return {article.get('id'): article for article in root.iter('article') if article.get('id')}
+
+
+def select_articles(articles, processed_articles, output_file):
+    """
+    Decides for every article whether it has to be sent to the LLM. Unchanged articles are copied from the
+    previous output file into the tree; the checkpoint entries of changed articles are removed.
+
+    Args:
+    articles (list): (number, article) pairs of the input file.
+    processed_articles (dict): The loaded checkpoint.
+    output_file (str): Output file of the previous run.
+
+    Returns:
+    tuple: (pending (number, article) pairs, Counter of 'new', 'changed', 'copied', 'kept', 'skipped').
+    """
+    previous = None
+    pending = []
+    counts = Counter()
+    for number, article in articles:
+        article_id = article.get('id')
+        entry = processed_articles.get(article_id)
+        if entry is None:
+            counts['new'] += 1
+        elif entry is True:
+            # Legacy checkpoint without hashes
+            print_progress(f"Skipping already processed article: {article_id}")
+            counts['skipped'] += 1
+            continue
+        elif output_hash(article) == entry.get('output'):
+            counts['kept'] += 1
+            continue
+        elif input_hash(article) == entry.get('input'):
+            if previous is None:
+                previous = load_previous_output(output_file)
+            if article_id in previous:
+                adopt(article, previous[article_id])
+                counts['copied'] += 1
+                continue
+            counts['new'] += 1
+            del processed_articles[article_id]
+        else:
+            counts['changed'] += 1
+            del processed_articles[article_id]
+        pending.append((number, article))
+    print(f"Articles: {counts['new']} new, {counts['changed']} changed, {counts['copied']} unchanged and copied "
+          f"from {output_file}, {counts['kept']} already processed in the input, "
+          f"{counts['skipped']} skipped (checkpoint without hashes)")
+    return pending, counts
@@ -0,0 +1,186 @@
+'''Byte-Offset-Index für große _process.log-Dateien. Die Logdatei wird per mmap eingeblendet, ein Datensatz
+wird erst dekodiert, wenn er angezeigt wird. Der Index wird neben der Logdatei (.idx) gespeichert und beim
+nächsten Öffnen wiederverwendet bzw. nur um die Offsets neu angehängter Zeilen ergänzt. Ist die Logdatei kürzer
+als beim letzten Indexieren oder haben sich ihre ersten FINGERPRINT_BYTES geändert, wird der Index neu aufgebaut.'''
+
+import os
+import mmap
+import json
+import struct
+import hashlib
+import threading
+from array import array
+from log_store import open_store, expand_record
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'LOGIDX02'
+# magic, indexed log size, number of offsets, length and hash of the log header
+HEADER = struct.Struct('<8sQQQ32s')
+FINGERPRINT_BYTES = 4096  # The first bytes of the log identify it
+RECORD_MARKER = b' - {'  # Separates the timestamp from the JSON record
+MARKER_WINDOW = 64  # The marker is searched within the first bytes of a line
+
+
+class LogIndex:
+    """
+    Index of the record lines of a process log.
+
+    Lines that do not hold a JSON record are not indexed. record(i) decodes the i-th record. refresh() and
+    record() may be called from different threads, e.g. while the search index is built in the background.
+    """
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.index_file = log_file + INDEX_SUFFIX
+        self.offsets = array('Q')  # Start offset of every record line
+        self.indexed_size = 0  # Number of bytes of the log covered by the index
+        self.header_length = 0  # Number of bytes at the start of the log covered by header_hash
+        self.header_hash = b''
+        self.saved = 0  # Number of offsets in the index file
+        self.lock = threading.RLock()  # Guards the file position and the mapping
+        self.file = open(log_file, 'rb')
+        self.map = None
+        self.store = None  # BlobStore of a compact log, opened with the first compact record
+        self.load_index()
+        self.refresh()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def hash_header(self, length):
+        with self.lock:
+            self.file.seek(0)
+            return hashlib.sha256(self.file.read(length)).digest()
+
+    def fingerprint(self):
+        """Identifies the log by its first bytes; appended lines do not change it."""
+        return self.header_hash
+
+    def load_index(self):
+        """Loads the cached index if it belongs to this log and the log was only appended to since."""
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                return
+            magic, indexed_size, count, header_length, header_hash = HEADER.unpack(header)
+            if magic != INDEX_MAGIC or indexed_size > os.path.getsize(self.log_file):
+                return
+            if header_hash != self.hash_header(header_length):
+                return
+            offsets = array('Q')
+            offsets.frombytes(f.read(count * offsets.itemsize))
+            if len(offsets) != count:
+                return
+        self.offsets = offsets
+        self.indexed_size = indexed_size
+        self.header_length = header_length
+        self.header_hash = header_hash
+        self.saved = count
+
+    def save_index(self):
+        """Appends the new offsets to the index file and updates its header; a new index is written whole."""
+        if self.saved == 0 or not os.path.exists(self.index_file):
+            with open(self.index_file, 'wb') as f:
+                f.write(HEADER.pack(INDEX_MAGIC, self.indexed_size, len(self.offsets), self.header_length,
+                                    self.header_hash))
+                self.offsets.tofile(f)
+        else:
+            with open(self.index_file, 'r+b') as f:
+                # Offsets beyond the count of the header (an interrupted update) are overwritten
+                f.seek(HEADER.size + self.saved * self.offsets.itemsize)
+                self.offsets[self.saved:].tofile(f)
+                f.truncate()
+                f.seek(0)
+                f.write(HEADER.pack(INDEX_MAGIC, self.indexed_size, len(self.offsets), self.header_length,
+                                    self.header_hash))
+        self.saved = len(self.offsets)
+
+    def reset(self):
+        """Forgets the index of a log that was truncated or replaced."""
+        self.offsets = array('Q')
+        self.indexed_size = 0
+        self.header_length = 0
+        self.header_hash = b''
+        self.saved = 0
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def changed(self, size):
+        """True if the log was truncated or replaced since it was indexed."""
+        if size < self.indexed_size:
+            return True
+        return self.header_length > 0 and self.hash_header(self.header_length) != self.header_hash
+
+    def refresh(self):
+        """Maps the log file again and indexes lines appended since the last call."""
+        with self.lock:
+            if os.stat(self.log_file).st_ino != os.fstat(self.file.fileno()).st_ino:
+                # The log was replaced by a new file
+                self.file.close()
+                self.file = open(self.log_file, 'rb')
+            size = os.fstat(self.file.fileno()).st_size
+            if self.changed(size):
+                print(f"{self.log_file} was truncated or replaced, the index is rebuilt.")
+                self.reset()
+            if size == 0 or (self.map is not None and size == len(self.map)):
+                return 0
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+            count = len(self.offsets)
+            position = self.indexed_size
+            while position < size:
+                end = self.map.find(b'\n', position)
+                if end == -1:
+                    break  # The last line is still being written
+                if self.map.find(RECORD_MARKER, position, min(position + MARKER_WINDOW, end)) != -1:
+                    self.offsets.append(position)
+                position = end + 1
+            if position != self.indexed_size:
+                if self.header_length < FINGERPRINT_BYTES:
+                    # The header grows with the first lines until FINGERPRINT_BYTES are indexed; the index file is
+                    # then written whole
+                    self.header_length = min(position, FINGERPRINT_BYTES)
+                    self.header_hash = self.hash_header(self.header_length)
+                    self.saved = 0
+                self.indexed_size = position
+                self.save_index()
+            return len(self.offsets) - count
+
+    def line(self, i):
+        """Returns the raw bytes of the i-th record line."""
+        with self.lock:
+            start = self.offsets[i]
+            end = self.map.find(b'\n', start)
+            return self.map[start:end]
+
+    def record(self, i):
+        """
+        Decodes the i-th record.
+
+        Returns:
+        dict: The JSON record with its 'timestamp', or None if the line cannot be decoded.
+        """
+        line = self.line(i).decode('utf-8', errors='replace')
+        timestamp, _, json_text = line.partition(' - ')
+        try:
+            record = json.loads(json_text)
+        except json.JSONDecodeError:
+            print(f"Fehler beim Parsen der Zeile: {line[:200]}")
+            return None
+        if 'blobs' in record and self.store is None:
+            self.store = open_store(self.log_file)
+        record = expand_record(record, self.store)
+        record.setdefault('timestamp', timestamp)
+        return record
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
@@ -0,0 +1,97 @@
+'''Asynchrone Protokollierung: Die Verarbeitungsschritte legen ihre Logeinträge nur in eine Queue, ein
+Hintergrund-Thread schreibt sie in die Logdatei. Die Datei wird nicht nach jedem Eintrag, sondern nach
+FLUSH_EVERY Einträgen bzw. spätestens nach FLUSH_INTERVAL Sekunden geleert.'''
+
+import time
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from log_store import CompactLogHandler
+
+FLUSH_EVERY = 50  # Number of records written before the file is flushed
+FLUSH_INTERVAL = 2.0  # Seconds after which pending records are flushed at the latest
+
+
+class BatchedFlushMixin:
+    """
+    Flushes the stream of a file handler only every FLUSH_EVERY records or FLUSH_INTERVAL seconds.
+    StreamHandler.emit() calls flush() after every record; flush_now() writes pending records.
+    """
+
+    def init_batching(self, flush_every, flush_interval):
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        self.pending += 1
+        if self.pending >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush_now()
+
+    def flush_now(self):
+        if self.pending:
+            super().flush()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush_now()
+        super().close()
+
+
+class BatchedFileHandler(BatchedFlushMixin, logging.FileHandler):
+    def __init__(self, filename, encoding='utf-8', flush_every=FLUSH_EVERY, flush_interval=FLUSH_INTERVAL):
+        self.init_batching(flush_every, flush_interval)
+        super().__init__(filename, encoding=encoding)
+
+
+class BatchedCompactLogHandler(BatchedFlushMixin, CompactLogHandler):
+    def __init__(self, filename, encoding='utf-8', flush_every=FLUSH_EVERY, flush_interval=FLUSH_INTERVAL):
+        self.init_batching(flush_every, flush_interval)
+        super().__init__(filename, encoding=encoding)
+        self.store.autocommit = False
+
+    def flush_now(self):
+        # The texts are committed before the log lines that refer to them
+        self.store.commit()
+        super().flush_now()
+
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener that flushes its handlers when no record arrived for FLUSH_INTERVAL seconds."""
+
+    def __init__(self, log_queue, *handlers, flush_interval=FLUSH_INTERVAL):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def stop(self):
+        # May be called by the program and again at exit
+        if self._thread is not None:
+            super().stop()
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    if isinstance(handler, BatchedFlushMixin):
+                        handler.flush_now()
+
+
+def start_queue_logging(handler, level=logging.INFO):
+    """
+    Attaches a QueueHandler to the root logger and starts a background thread that passes the records to
+    `handler`.
+
+    Returns:
+    FlushingQueueListener: The started listener; stop() writes the remaining records.
+    """
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+    listener = FlushingQueueListener(log_queue, handler)
+    listener.start()
+    return listener
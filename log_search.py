@@ -0,0 +1,162 @@
+'''Persistenter Suchindex (SQLite FTS5) für _process.log-Dateien, der neben der Logdatei gespeichert wird.
+Unterstützt die Suche nach ID, die Teilwortsuche in content_text und response_text sowie Statusfilter.
+Neu angehängte Zeilen der Logdatei werden beim nächsten update() nachgetragen. update_in_background() baut den
+Index in einem eigenen Thread auf, damit eine große Logdatei sofort angezeigt werden kann; bis er fertig ist,
+finden die Suchen die bereits indizierten Datensätze.'''
+
+import sqlite3
+import threading
+
+SEARCH_SUFFIX = '.search.sqlite'
+BATCH_SIZE = 5000  # Number of records written per transaction
+MIN_QUERY_LENGTH = 3  # The trigram tokenizer needs at least three characters
+MAX_HITS = 10000
+
+
+class LogSearch:
+    """
+    Search index of the records of a LogIndex. The row id of every record is its position in the LogIndex.
+    Every thread uses its own connection; the database is written in WAL mode, so searches read the records
+    committed so far while the index is built in the background.
+    """
+
+    def __init__(self, log_index):
+        self.log_index = log_index
+        self.path = log_index.log_file + SEARCH_SUFFIX
+        self.local = threading.local()
+        self.builder = None  # Thread of update_in_background()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.create_tables()
+
+    @property
+    def connection(self):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = sqlite3.connect(self.path)
+        return self.local.connection
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS records (rowid INTEGER PRIMARY KEY, id TEXT, status TEXT)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS records_id ON records (id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS records_status ON records (status)")
+            # Contentless table: the texts stay in the log file, only the trigram index is stored
+            self.connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5("
+                "content_text, response_text, content='', tokenize='trigram')")
+
+    def get_meta(self, key, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def reset(self):
+        with self.connection:
+            self.connection.execute("DROP TABLE IF EXISTS records")
+            self.connection.execute("DROP TABLE IF EXISTS texts")
+            self.connection.execute("DELETE FROM meta")
+        self.create_tables()
+
+    def update(self):
+        """Adds the records appended to the log since the last update. Returns the number of new records."""
+        indexed = int(self.get_meta('indexed', 0))
+        # A rewritten log file gets a new index. The first bytes of the log are compared over the length they had
+        # when the index was written, so appended lines of a short log do not count as a change.
+        header_length = int(self.get_meta('header_length', 0))
+        if indexed > len(self.log_index) or (
+                indexed and self.get_meta('fingerprint') != self.log_index.hash_header(header_length).hex()):
+            self.reset()
+            indexed = 0
+        fingerprint = self.log_index.fingerprint().hex()
+        header_length = self.log_index.header_length
+
+        count = len(self.log_index)
+        for start in range(indexed, count, BATCH_SIZE):
+            if self.log_index.fingerprint().hex() != fingerprint:
+                break  # The log was rewritten while it was indexed, the next update starts again
+            records, texts = [], []
+            for i in range(start, min(start + BATCH_SIZE, count)):
+                record = self.log_index.record(i) or {}
+                unit_id = record.get('id', record.get('chunk_id'))
+                records.append((i, None if unit_id is None else str(unit_id), record.get('status')))
+                texts.append((i, record.get('content_text', record.get('content', '')),
+                              record.get('response_text', record.get('response', ''))))
+            with self.connection:
+                self.connection.executemany("INSERT INTO records (rowid, id, status) VALUES (?, ?, ?)", records)
+                self.connection.executemany(
+                    "INSERT INTO texts (rowid, content_text, response_text) VALUES (?, ?, ?)", texts)
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('indexed', ?)", (str(i + 1),))
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('header_length', ?)",
+                                        (str(header_length),))
+        return count - indexed
+
+    def update_in_background(self):
+        """Starts update() on a background thread unless it is already running."""
+        if not self.building():
+            self.builder = threading.Thread(target=self.build, name='log_search', daemon=True)
+            self.builder.start()
+
+    def build(self):
+        try:
+            self.update()
+        except IndexError:
+            pass  # The log was rewritten while it was indexed, the next update starts again
+        finally:
+            self.connection.close()
+            del self.local.connection
+
+    def building(self):
+        return self.builder is not None and self.builder.is_alive()
+
+    def indexed(self):
+        """Number of records that can be found."""
+        try:
+            return int(self.get_meta('indexed', 0))
+        except sqlite3.OperationalError:
+            return 0  # The tables are being recreated for a rewritten log
+
+    def lookup_id(self, unit_id, status=None):
+        """Returns the positions of the records with exactly this id."""
+        query = "SELECT rowid FROM records WHERE id = ?"
+        parameters = [unit_id]
+        if status:
+            query += " AND status = ?"
+            parameters.append(status)
+        try:
+            return [row[0] for row in self.connection.execute(query + " ORDER BY rowid", parameters)]
+        except sqlite3.OperationalError:
+            return []  # The tables are being recreated for a rewritten log
+
+    def search(self, text='', status=None, field=None):
+        """
+        Returns the positions of the records whose texts contain `text` (at least MIN_QUERY_LENGTH
+        characters, all words in this order) and whose status matches. Without text, all records
+        with the status are returned.
+
+        Args:
+        text (str): Searched text.
+        status (str): 'success', 'error' or None for all records.
+        field (str): 'content_text', 'response_text' or None for both.
+        """
+        conditions, parameters = [], []
+        if text:
+            if len(text) < MIN_QUERY_LENGTH:
+                return []
+            phrase = '"' + text.replace('"', '""') + '"'
+            conditions.append("rowid IN (SELECT rowid FROM texts WHERE texts MATCH ?)")
+            parameters.append(f"{field}:{phrase}" if field else phrase)
+        if status:
+            conditions.append("status = ?")
+            parameters.append(status)
+        query = "SELECT rowid FROM records"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY rowid LIMIT {MAX_HITS}"
+        try:
+            return [row[0] for row in self.connection.execute(query, parameters)]
+        except sqlite3.OperationalError:
+            return []
+
+    def close(self):
+        self.connection.close()
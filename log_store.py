@@ -0,0 +1,200 @@
+'''Kompakte Speicherung der _process.log-Datei. Die großen Texte eines Logeintrags (content, response,
+content_text, response_text) werden komprimiert und nur einmal in einer SQLite-Datei neben der Logdatei
+(.store.sqlite) gespeichert, adressiert über ihren Hash. Die Zeile in der Logdatei enthält nur noch id, status,
+message und die Hashes. Texte, die sich aus einem anderen Feld ableiten lassen (z.B. content_text aus content),
+werden gar nicht gespeichert.
+Die Lesefunktionen expand_record() und iter_log_records() liefern die Einträge wieder vollständig, sodass
+check.py, statist_log.py und rerun_failed.py alte und kompakte Logdateien gleichermaßen lesen.'''
+
+import re
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+import xml.etree.ElementTree as ET
+
+STORE_SUFFIX = '.store.sqlite'
+PAYLOAD_FIELDS = ('content', 'response', 'content_text', 'response_text')
+MIN_PAYLOAD_LENGTH = 64  # Shorter texts stay in the log line
+COMPRESSION_LEVEL = 6
+
+
+def strip_tags(text):
+    return re.sub(r'<[^>]+>', '', text)
+
+
+def xml_text(text):
+    return ''.join(ET.fromstring(text).itertext())
+
+
+# Ways to rebuild a text field from another field, tried in this order
+DERIVATIONS = {
+    'tags': strip_tags,
+    'xml_text': xml_text,
+}
+
+
+def derive(name, text):
+    """Returns the text derived from `text`, or None if the derivation does not apply."""
+    try:
+        return DERIVATIONS[name](text)
+    except ET.ParseError:
+        return None
+
+
+class BlobStore:
+    """
+    Content-addressed store of compressed texts. Identical texts are stored once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.autocommit = True  # Otherwise commit() writes the stored texts in one transaction
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, data BLOB)")
+
+    @staticmethod
+    def digest(text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def put(self, text):
+        """Stores the text and returns its digest."""
+        digest = self.digest(text)
+        data = zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+        with self.lock:
+            self.connection.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?)", (digest, data))
+            if self.autocommit:
+                self.connection.commit()
+        return digest
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def get(self, digest):
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(f"Text {digest} not found in {self.path}")
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.commit()
+        self.connection.close()
+        self.connection = None
+
+
+def open_store(log_file):
+    """Returns the BlobStore of the log file, or None if the log was written without one."""
+    path = log_file + STORE_SUFFIX
+    return BlobStore(path) if os.path.exists(path) else None
+
+
+def compact_record(record, store):
+    """
+    Replaces the large text fields of a log entry by references.
+
+    Returns:
+    dict: The entry with 'blobs' (field -> digest) and 'derived' (field -> [source field, derivation]).
+    """
+    record = dict(record)
+    blobs, derived = {}, {}
+    for field in PAYLOAD_FIELDS:
+        text = record.get(field)
+        if not isinstance(text, str) or len(text) < MIN_PAYLOAD_LENGTH:
+            continue
+        # Only fields stored before can be a source, so the entry never refers to itself
+        for source in PAYLOAD_FIELDS[:PAYLOAD_FIELDS.index(field)]:
+            if not isinstance(record.get(source), str) or source in derived:
+                continue
+            name = next((name for name in DERIVATIONS if derive(name, record[source]) == text), None)
+            if name:
+                derived[field] = [source, name]
+                break
+        else:
+            blobs[field] = store.put(text)
+    for field in (*blobs, *derived):
+        del record[field]
+    if blobs:
+        record['blobs'] = blobs
+    if derived:
+        record['derived'] = derived
+    return record
+
+
+def expand_record(record, store):
+    """
+    Restores the text fields of a compact log entry. Entries without references are returned unchanged.
+
+    Returns:
+    dict: The complete log entry.
+    """
+    blobs = record.pop('blobs', None)
+    derived = record.pop('derived', None)
+    if blobs:
+        if store is None:
+            raise FileNotFoundError("The log entry references texts, but there is no .store.sqlite file")
+        for field, digest in blobs.items():
+            record[field] = store.get(digest)
+    for field, (source, name) in (derived or {}).items():
+        record[field] = derive(name, record[source])
+    return record
+
+
+def iter_log_records(log_file):
+    """
+    Yields the complete entries of a process log with their 'timestamp'. Lines that cannot be decoded are
+    reported and skipped.
+    """
+    store = open_store(log_file)
+    try:
+        with open(log_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    timestamp, json_text = line.split(' - ', 1)
+                    record = json.loads(json_text)
+                except (ValueError, json.JSONDecodeError) as e:
+                    print(f"Error processing line: {line[:200]}\n{e}")
+                    continue
+                record = expand_record(record, store)
+                record.setdefault('timestamp', timestamp)
+                yield record
+    finally:
+        if store is not None:
+            store.close()
+
+
+class CompactLogHandler(logging.FileHandler):
+    """
+    File handler that writes JSON log entries in compact form and their texts into the BlobStore.
+    Messages that are not JSON objects are written unchanged.
+    """
+
+    def __init__(self, filename, encoding='utf-8'):
+        super().__init__(filename, encoding=encoding)
+        self.store = BlobStore(filename + STORE_SUFFIX)
+
+    def emit(self, record):
+        try:
+            entry = json.loads(record.getMessage())
+        except (ValueError, TypeError):
+            entry = None
+        if isinstance(entry, dict):
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = json.dumps(compact_record(entry, self.store), ensure_ascii=False)
+            record.args = None
+        super().emit(record)
+
+    def close(self):
+        super().close()
+        self.store.close()
@@ -1,24 +1,56 @@
 ''''Steuert die Verarbeitung von A) Processing mode, B) Wahl des LLM-Providers, C) Engabe- und Ausgabedateien
 Enthällt Funktionen, die von Skripten gemeinsam aufgerufen werden, z.B.: configure_logging(), configure_api(),
-call_ai(), generate_content_with_retries().'''
+call_ai(), generate_content_with_retries().
+
+Ohne Argumente gelten die Konstanten unten. Für unbeaufsichtigte Läufe lassen sich alle Einstellungen auf der
+Kommandozeile oder in einer JSON-Datei angeben, z.B.:
+    python main.py --yes --mode xml_article --provider openai --input /data/lexikon.xml --output-dir /data/out
+    python main.py --yes --config jobs.json
+Eine JSON-Datei mit {"jobs": [{...}, {...}]} startet jeden Job als eigenen Prozess parallel; die Schlüssel
+entsprechen den Argumenten (mode, provider, model, input, output_dir, concurrency, ...).'''
 
 import sys
 import os
 import time
+import json
+import atexit
 import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 from requests.exceptions import ConnectionError
 import google.generativeai as genai
-from openai import OpenAI
-import json
+from openai import OpenAI, APITimeoutError
+from google.api_core.exceptions import DeadlineExceeded
+import httpx
 from aio_straico import straico_client
-from StraicoModelleLesen import StraicoModelleLesen
+from StraicoModelleLesen import StraicoModelleLesen, get_model_limits as get_straico_model_limits
+from log_store import CompactLogHandler
+from log_queue import BatchedFileHandler, BatchedCompactLogHandler, start_queue_logging
+from metrics import metrics
+from profiling import configure_profiling, profile_stage
+
+# Run as a script, this module is '__main__'; the process modules import it as 'main' and must see the same
+# settings, e.g. those given on the command line
+sys.modules.setdefault('main', sys.modules[__name__])
 
 # Determine processing mode 'text' or 'xml_paragraph' or 'xml_article'
 PROCESSING_MODE = 'text'
+# Re-send only the units that failed according to the process log and patch them into the output file
+REPAIR_FAILED_UNITS = False
 
-# Determine AI provider 'openai' or 'google' or 'straico'
+# Determine AI provider 'openai' or 'google' or 'straico' ('mock' answers locally, see benchmark.py)
+# or 'router' to spread the requests over ROUTES (see provider_router.py)
 PROVIDER = 'straico'
 API_KEY = os.environ.get('STRAICO_API_KEY')
+# Model name; None uses the default of the provider (for 'straico' the model is selected in a dialog)
+MODEL = None
+# Providers and models used by PROVIDER 'router'; requests are spread by weight
+ROUTES = [
+    {'provider': 'openai', 'model': 'gpt-4o', 'weight': 3},
+    {'provider': 'google', 'model': 'gemini-1.5-pro', 'weight': 1},
+]
 
 # Input filename
 INPUT_FILENAME = 'Bible_Character_en.txt'
@@ -32,13 +64,90 @@ CHECKPOINT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)
 OUTPUT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_out')
 PROCESS_LOG_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_process.log')
 ERROR_LOG_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_error.log')
+METRICS_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_metrics.txt')
+CONSOLE_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_console.txt')  # Output of a job
+# Store the texts of the process log once, compressed, in PROCESS_LOG_FILE + '.store.sqlite' (see log_store.py)
+COMPACT_LOG = False
+# Write the process log on a background thread with batched flushes (see log_queue.py)
+QUEUE_LOGGING = True
+# Print one short progress line per unit instead of the full request and response texts and the per-unit
+# messages; errors and retries are still printed
+QUIET = False
+# Profile the stages of a run with cProfile / tracemalloc; reports are written next to PROCESS_LOG_FILE
+PROFILE = False
+PROFILE_MEMORY = False
+
+# Send identical units only once and report near-duplicates (see dedup.py); reused responses are logged with
+# dedup_of
+DEDUPLICATE = False
 
 # Constants
 MAX_RETRIES = 5  # Maximum number of retries for content generation
 BACKOFF_FACTOR = 0.3  # Factor for exponential backoff in case of connection errors
+CONCURRENCY = 1  # Number of requests sent to the AI provider at the same time
+MIN_REQUEST_INTERVAL = 0  # Minimum seconds between the start of two requests, shared by all workers
+# Seconds to establish the connection and to wait for the response, per provider. A call that has not returned
+# after both plus TIMEOUT_GRACE is abandoned and retried like a connection error.
+TIMEOUTS = {
+    'openai': {'connect': 10, 'read': 180},
+    'google': {'connect': 10, 'read': 300},
+    'straico': {'connect': 10, 'read': 300},
+    'mock': {'connect': 1, 'read': 60},
+}
+TIMEOUT_GRACE = 5
+# Abandoned calls whose threads and connections may still be running; further calls wait until one of them ends.
+# Calls already started may still time out, so at most MAX_ABANDONED_CALLS + concurrency - 1 threads are abandoned
+MAX_ABANDONED_CALLS = 8
+# Seconds after the start of processing from which no new units are dispatched; units in progress are finished
+# and checkpointed, the rest is processed on the next run. None: no deadline
+RUN_DEADLINE = None
+
+# Model limits for request sizing: 'word_limit' is the context size in words, 'max_output' in tokens
+MODEL_LIMITS = {
+    'google': {'word_limit': 750000, 'max_output': 8192},  # gemini-1.5-pro
+    'openai': {'word_limit': 96000, 'max_output': 16384},  # gpt-4o
+}
+WORDS_PER_TOKEN = 0.75  # Average number of words per output token
+OUTPUT_RATIO = 1.2  # Expected length of the response relative to the request
+REQUEST_SAFETY_MARGIN = 0.8  # Share of the computed budget that is actually used
+MOCK_LATENCY = 0.5  # Seconds the 'mock' provider waits before it returns the request text unchanged
+
+# Route that answered the last request of the current thread ('provider:model'), set by PROVIDER 'router', and
+# the unit whose response was reused for it (dedup_of, set by dedup.Deduplicator)
+serving = threading.local()
+deadline_at = None  # time.monotonic() value of the run deadline
+throttle_lock = threading.Lock()
+abandoned_changed = threading.Condition()
+abandoned_calls = 0  # Calls that timed out and are still running
+next_request_at = 0.0  # time.monotonic() value from which the next request may start
+
+
+class CallTimeout(TimeoutError):
+    """A provider did not answer within its timeouts."""
 
 def configure_logging():
-    """Set up logging configuration."""
+    """
+    Set up logging configuration.
+
+    Returns:
+    QueueListener: The listener writing the log file if QUEUE_LOGGING is set, otherwise None.
+    """
+    if QUEUE_LOGGING:
+        handler_class = BatchedCompactLogHandler if COMPACT_LOG else BatchedFileHandler
+        handler = handler_class(PROCESS_LOG_FILE)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+        listener = start_queue_logging(handler)
+        # Remaining records are written when the program ends
+        atexit.register(listener.stop)
+        return listener
+    if COMPACT_LOG:
+        logging.basicConfig(
+            handlers=[CompactLogHandler(PROCESS_LOG_FILE)],
+            level=logging.INFO,
+            format='%(asctime)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+        return
     logging.basicConfig(
         filename=PROCESS_LOG_FILE,
         level=logging.INFO,
@@ -48,47 +157,195 @@ def configure_logging():
     )
 
 
-def configure_api():
-    if PROVIDER == 'google':
+def print_unit_texts(content_label, content, response_label, response):
+    """Prints the request and response text of a unit; in QUIET mode only their word counts."""
+    if QUIET:
+        print(f"{content_label}: {len(content.split())} words -> {response_label}: {len(response.split())} words")
+        return
+    print(f"{content_label}: ")
+    print(content)
+    print()
+    print(f"{response_label}: ")
+    print(response)
+
+
+def print_progress(message):
+    """Prints a per-unit progress message; in QUIET mode it is left out."""
+    if not QUIET:
+        print(message)
+
+
+def served_by():
+    """Returns the route that answered the last request of the current thread, or None without routing."""
+    return getattr(serving, 'provider', None)
+
+
+def deduplicated_from():
+    """Returns the unit whose response the last unit of the current thread reused (see dedup.py), or None."""
+    return getattr(serving, 'dedup_of', None)
+
+
+def create_model(provider, model_name):
+    """Returns the model argument call_ai() expects for the provider: a GenerativeModel or the model name."""
+    if provider == 'google':
         """Configure the Google GenerativeAI API."""
         genai_api_key = os.getenv('GENAI_API_KEY')
         if not genai_api_key:
             raise ValueError("GENAI_API_KEY environment variable not set")
         genai.configure(api_key=genai_api_key)
-        """Initialize and return the GenerativeAI model."""
-        model_name = 'gemini-1.5-pro'
         return genai.GenerativeModel(model_name)
+    return model_name
+
+
+def configure_api():
+    if PROVIDER == 'google':
+        """Initialize and return the GenerativeAI model."""
+        return create_model('google', MODEL or 'gemini-1.5-pro')
     elif PROVIDER == 'openai':
-        model_name = 'gpt-4o'
+        model_name = MODEL or 'gpt-4o'
         return model_name
     elif PROVIDER == 'straico':
-        model_name = StraicoModelleLesen()
+        model_name = MODEL or StraicoModelleLesen()
         return model_name
+    elif PROVIDER == 'mock':
+        return 'mock'
+    elif PROVIDER == 'router':
+        from provider_router import ProviderRouter
+        return ProviderRouter(ROUTES)
     else:
         print("No valid AI provider determined")
 
 
-def call_ai(PROVIDER, model, prompt, chunk):
+def get_model_limits(PROVIDER, model):
+    """
+    Returns the limits of the selected model.
+
+    Returns:
+    dict: {'word_limit': int, 'max_output': int} or None if the limits are unknown.
+    """
+    if PROVIDER == 'straico':
+        return get_straico_model_limits(model)
+    if PROVIDER == 'router':
+        return model.limits()
+    return MODEL_LIMITS.get(PROVIDER)
+
+
+def max_words_per_request(limits, prompt):
+    """
+    Computes how many words of content fit into one request, so that request and expected
+    response stay within the context size and the response stays within max_output.
+
+    Args:
+    limits (dict): Model limits as returned by get_model_limits().
+    prompt (str): The prompt sent with every request.
+
+    Returns:
+    int: Maximum number of content words per request, or None if the limits are unknown.
+    """
+    if not limits:
+        return None
+    context_words = (limits['word_limit'] - len(prompt.split())) / (1 + OUTPUT_RATIO)
+    output_words = limits['max_output'] * WORDS_PER_TOKEN / OUTPUT_RATIO
+    return max(1, int(min(context_words, output_words) * REQUEST_SAFETY_MARGIN))
+
+
+def request_ai(PROVIDER, model, prompt, chunk, timeouts):
+    """Sends the request to the provider with its connect and read timeouts."""
     if PROVIDER == 'google':
-        response = model.generate_content(prompt + chunk).text
+        try:
+            response = model.generate_content(prompt + chunk, request_options={'timeout': timeouts['read']}).text
+        except DeadlineExceeded as e:
+            raise CallTimeout(f"Request timed out: {e}") from e
     elif PROVIDER == 'openai':
-        client = OpenAI()
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": chunk}
-            ],
-            temperature=0.6
-        )
+        client = OpenAI(timeout=httpx.Timeout(timeouts['read'], connect=timeouts['connect']), max_retries=0)
+        try:
+            completion = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": prompt},
+                    {"role": "user", "content": chunk}
+                ],
+                temperature=0.6
+            )
+        except APITimeoutError as e:
+            raise CallTimeout(f"Request timed out: {e}") from e
         response = completion.choices[0].message.content
     elif PROVIDER == 'straico':
-        with straico_client() as client:
-            reply = client.prompt_completion(model, prompt + chunk)
+        with straico_client(timeout=httpx.Timeout(timeouts['read'], connect=timeouts['connect'])) as client:
+            try:
+                reply = client.prompt_completion(model, prompt + chunk)
+            except httpx.TimeoutException as e:
+                raise CallTimeout(f"Request timed out: {e}") from e
             response = reply['completion']['choices'][0]['message']['content']
+    elif PROVIDER == 'mock':
+        time.sleep(MOCK_LATENCY)
+        response = chunk
     return response
 
 
+def throttle():
+    """Waits until MIN_REQUEST_INTERVAL has passed since the start of the previous request of any worker."""
+    global next_request_at
+    if not MIN_REQUEST_INTERVAL:
+        return
+    with throttle_lock:
+        now = time.monotonic()
+        start = max(now, next_request_at)
+        next_request_at = start + MIN_REQUEST_INTERVAL
+    if start > now:
+        time.sleep(start - now)
+
+
+def call_ai(PROVIDER, model, prompt, chunk):
+    """
+    Sends the request on a daemon thread and abandons it if it does not return within the timeouts of the
+    provider, so that a hung connection cannot block the run. At most MAX_ABANDONED_CALLS abandoned calls
+    may still be running; a new call waits until one of them ends.
+
+    Raises:
+    CallTimeout: The provider did not answer in time, or too many abandoned calls are still running.
+    """
+    global abandoned_calls
+    if PROVIDER == 'router':
+        # The router applies the timeouts of each route
+        return model.call(prompt, chunk)
+    timeouts = TIMEOUTS[PROVIDER]
+    limit = timeouts['connect'] + timeouts['read'] + TIMEOUT_GRACE
+    with abandoned_changed:
+        if not abandoned_changed.wait_for(lambda: abandoned_calls < MAX_ABANDONED_CALLS, timeout=limit):
+            raise CallTimeout(f"Request timed out: {abandoned_calls} abandoned calls are still running")
+    throttle()
+    future = Future()
+    abandoned = []  # Set when the caller gives up on the call
+
+    def run():
+        global abandoned_calls
+        try:
+            future.set_result(request_ai(PROVIDER, model, prompt, chunk, timeouts))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with abandoned_changed:
+                if abandoned:
+                    abandoned_calls -= 1
+                    abandoned_changed.notify_all()
+
+    threading.Thread(target=run, name=f'call_ai-{PROVIDER}', daemon=True).start()
+    try:
+        return future.result(timeout=limit)
+    except TimeoutError:
+        if future.done():
+            raise
+    with abandoned_changed:
+        if not future.done():
+            abandoned.append(True)
+            abandoned_calls += 1
+    if abandoned:
+        raise CallTimeout(f"Request timed out: {PROVIDER} did not answer within {limit} s")
+    # The call ended while it was being abandoned
+    return future.result()
+
+
 def generate_content_with_retries(PROVIDER, model, chunk: str, prompt) -> str:
     """
     Attempts to generate content using the AI model with a retry mechanism.
@@ -100,11 +357,21 @@ def generate_content_with_retries(PROVIDER, model, chunk: str, prompt) -> str:
 
     Returns:
     str: The generated content or an error message.
+
+    Raises:
+    CallTimeout: The provider did not answer in time in any attempt; the unit is logged as failed.
     """
+    words_in = len(chunk.split())
+    serving.provider = None
+    serving.dedup_of = None
     for attempt in range(MAX_RETRIES):
+        call_start = time.monotonic()
         try:
-            print(f"Attempting content generation (Attempt {attempt + 1}/{MAX_RETRIES})...")
-            return call_ai(PROVIDER, model, prompt, chunk)
+            print_progress(f"Attempting content generation (Attempt {attempt + 1}/{MAX_RETRIES})...")
+            response = call_ai(PROVIDER, model, prompt, chunk)
+            metrics.record_call(time.monotonic() - call_start, words_in, len((response or '').split()), 'success',
+                                attempt + 1)
+            return response
         except ConnectionError:
             if attempt < MAX_RETRIES - 1:
                 sleep_time = BACKOFF_FACTOR * (2 ** attempt)
@@ -112,51 +379,280 @@ def generate_content_with_retries(PROVIDER, model, chunk: str, prompt) -> str:
                 time.sleep(sleep_time)
             else:
                 print("Maximum number of attempts reached. Connection not possible.")
+                metrics.record_call(time.monotonic() - call_start, words_in, 0, 'failed', attempt + 1)
+                raise
+        except CallTimeout as e:
+            if attempt < MAX_RETRIES - 1:
+                sleep_time = BACKOFF_FACTOR * (2 ** attempt)
+                print(f"{e}. Retrying in {sleep_time} seconds...")
+                time.sleep(sleep_time)
+            else:
+                # The caller logs the unit as failed, it can be repaired with REPAIR_FAILED_UNITS
+                print("Maximum number of attempts reached. The provider does not answer in time.")
+                metrics.record_call(time.monotonic() - call_start, words_in, 0, 'failed', attempt + 1)
                 raise
         except Exception as e:
             print(f"An error occurred in generate_content(): {e}")
+            metrics.record_call(time.monotonic() - call_start, words_in, 0, 'error', attempt + 1)
             return str(e)
 
-def process_files(mode, model):
+
+def start_deadline(seconds=None):
+    """Starts the run deadline RUN_DEADLINE (or `seconds`) from now; None switches it off."""
+    global deadline_at
+    seconds = RUN_DEADLINE if seconds is None else seconds
+    deadline_at = time.monotonic() + seconds if seconds is not None else None
+
+
+def deadline_reached():
+    """True once the run deadline has passed; no new units are dispatched from then on."""
+    return deadline_at is not None and time.monotonic() >= deadline_at
+
+
+def map_unordered(func, items, concurrency=None, stop=None):
+    """
+    Applies func to every item with up to `concurrency` worker threads.
+
+    Args:
+    func: Function called with a single item.
+    items: Iterable of items to process.
+    concurrency (int): Maximum number of calls running at the same time; None uses CONCURRENCY.
+    stop: Function without arguments; once it returns True no further items are started, the running ones
+        are finished and yielded (e.g. deadline_reached).
+
+    Yields:
+    tuple: (index, result) pairs in order of completion, index being the position of the item in items.
+    """
+    if concurrency is None:
+        concurrency = CONCURRENCY  # Read at call time, so changes by the command line apply
+    items = iter(enumerate(items))
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        def submit_next():
+            if stop and stop():
+                return
+            for index, item in items:
+                pending[executor.submit(func, item)] = index
+                return
+
+        for _ in range(max(1, concurrency)):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                submit_next()
+                yield index, future.result()
+
+
+def process_files(mode, model, repair=False):
     """Process files based on the selected mode."""
     print(f"Processing mode: {mode}")
-    if mode == 'text':
+    limits = get_model_limits(PROVIDER, model)
+    print(f"Model limits: {limits}")
+    metrics.start(METRICS_FILE)
+    start_deadline()
+    if repair:
+        from rerun_failed import rerun_failed_units
+        rerun_failed_units(PROVIDER, model, mode, PROCESS_LOG_FILE, OUTPUT_FILE, CHECKPOINT_FILE, limits,
+                           CONCURRENCY, INPUT_FILE)
+    elif mode == 'text':
         from process_txt import process_text_file
-        process_text_file(PROVIDER, model, INPUT_FILE, DIRECTORY_PATH, OUTPUT_FILE)
+        process_text_file(PROVIDER, model, INPUT_FILE, DIRECTORY_PATH, OUTPUT_FILE, CONCURRENCY, limits,
+                          DEDUPLICATE)
     elif mode == 'xml_paragraph':
         from process_xml_paragraph import process_xml_file
-        process_xml_file(PROVIDER, model, INPUT_FILE, CHECKPOINT_FILE, OUTPUT_FILE)
+        process_xml_file(PROVIDER, model, INPUT_FILE, CHECKPOINT_FILE, OUTPUT_FILE, concurrency=CONCURRENCY,
+                         deduplicate=DEDUPLICATE)
     elif mode == 'xml_article':
         from process_xml_article import process_xml_file
-        process_xml_file(PROVIDER, model, INPUT_FILE, CHECKPOINT_FILE, OUTPUT_FILE)
+        process_xml_file(PROVIDER, model, INPUT_FILE, CHECKPOINT_FILE, OUTPUT_FILE, limits=limits,
+                         concurrency=CONCURRENCY)
     else:
         print("No valid processing mode available. Select available processing mode")
+        return
+    metrics.report()
+    if PROVIDER == 'router':
+        model.report()
+
+
+# Command line / config file keys and the settings they override
+SETTINGS = {
+    'mode': 'PROCESSING_MODE',
+    'provider': 'PROVIDER',
+    'model': 'MODEL',
+    'concurrency': 'CONCURRENCY',
+    'repair': 'REPAIR_FAILED_UNITS',
+    'quiet': 'QUIET',
+    'deadline': 'RUN_DEADLINE',
+    'deduplicate': 'DEDUPLICATE',
+}
+PATH_SETTINGS = ('input', 'output_dir')
+
+
+def set_paths(input_file, output_dir):
+    """Sets the input file and derives the output, checkpoint, log and metrics files from it."""
+    global INPUT_FILENAME, DIRECTORY_PATH, INPUT_FILE, OUTPUT_TXT_PATH, CHECKPOINT_FILE, OUTPUT_FILE
+    global PROCESS_LOG_FILE, ERROR_LOG_FILE, METRICS_FILE, CONSOLE_FILE
+    INPUT_FILENAME = os.path.basename(input_file)
+    DIRECTORY_PATH = os.path.dirname(input_file)
+    INPUT_FILE = input_file
+    OUTPUT_TXT_PATH = output_dir
+    stem = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0])
+    CHECKPOINT_FILE = stem + '_check.json'
+    OUTPUT_FILE = stem + '_out'
+    PROCESS_LOG_FILE = stem + '_process.log'
+    ERROR_LOG_FILE = stem + '_error.log'
+    METRICS_FILE = stem + '_metrics.txt'
+    CONSOLE_FILE = stem + '_console.txt'
+
+
+def apply_config(config):
+    """
+    Overrides the settings of this module.
+
+    Args:
+    config (dict): Keys of SETTINGS and PATH_SETTINGS; None values are ignored.
+    """
+    unknown = set(config) - set(SETTINGS) - set(PATH_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    for key, name in SETTINGS.items():
+        if config.get(key) is not None:
+            globals()[name] = config[key]
+    if config.get('input') or config.get('output_dir'):
+        set_paths(config.get('input') or INPUT_FILE, config.get('output_dir') or OUTPUT_TXT_PATH)
+        os.makedirs(OUTPUT_TXT_PATH, exist_ok=True)
+
+
+def load_config(config_file):
+    """Reads a JSON config file: an object with settings, optionally with a "jobs" list of settings."""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{config_file} must contain a JSON object")
+    return config
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Lektoriert txt- und xml-Dateien mit einem LLM.")
+    parser.add_argument('--mode', choices=['text', 'xml_paragraph', 'xml_article'])
+    parser.add_argument('--provider', choices=['openai', 'google', 'straico', 'mock', 'router'])
+    parser.add_argument('--model', help="Model name (required for 'straico' with --yes)")
+    parser.add_argument('--input', help="Input file; output, checkpoint and log files are named after it")
+    parser.add_argument('--output-dir', dest='output_dir')
+    parser.add_argument('--concurrency', type=int)
+    parser.add_argument('--deadline', type=float, help="Seconds after which no new units are dispatched")
+    parser.add_argument('--repair', action='store_true', default=None, help="Re-send only the failed units")
+    parser.add_argument('--quiet', action='store_true', default=None)
+    parser.add_argument('--deduplicate', action='store_true', default=None,
+                        help="Send identical units only once and report near-duplicates")
+    parser.add_argument('--config', help='JSON file with settings, or with {"jobs": [...]} for parallel jobs')
+    parser.add_argument('--yes', action='store_true', help="Do not ask before starting (unattended runs)")
+    return parser.parse_args(argv)
+
+
+def job_command(job):
+    """Returns the command line that runs one job of a jobs file in its own process."""
+    command = [sys.executable, os.path.abspath(__file__), '--yes']
+    for key, value in job.items():
+        option = '--' + key.replace('_', '-')
+        if value is True:
+            command.append(option)
+        elif value is not None and value is not False:
+            command += [option, str(value)]
+    return command
+
+
+def run_jobs(jobs):
+    """
+    Starts every job as a separate process and waits for all of them. The console output of a job is written
+    to <output_dir>/<input name>_console.txt.
+
+    Args:
+    jobs (list): Settings per job, see apply_config().
+
+    Returns:
+    int: The number of jobs that failed.
+    """
+    console_files = []
+    for job in jobs:
+        apply_config(job)
+        if CONSOLE_FILE in console_files:
+            raise ValueError(f"Several jobs write to {CONSOLE_FILE}; give them different inputs or output_dir")
+        console_files.append(CONSOLE_FILE)
+
+    processes = []
+    for job, console_file in zip(jobs, console_files):
+        console = open(console_file, 'w', encoding='utf-8')
+        process = subprocess.Popen(job_command(job), stdout=console, stderr=subprocess.STDOUT,
+                                   env=dict(os.environ, PYTHONIOENCODING='utf-8'))
+        processes.append((process, console, console_file))
+        print(f"Job started (pid {process.pid}): {job.get('input', INPUT_FILE)} -> {console_file}")
+
+    failed = 0
+    for process, console, console_file in processes:
+        returncode = process.wait()
+        console.close()
+        failed += returncode != 0
+        print(f"Job {'finished' if returncode == 0 else f'failed ({returncode})'}: {console_file}")
+    return failed
+
+
+def main(argv=None):
+    """
+    Main function to run the script.
+
+    Returns:
+    int: Exit status, 0 if all processing completed.
+    """
+    arguments = parse_arguments(argv)
+    config = load_config(arguments.config) if arguments.config else {}
+    jobs = config.pop('jobs', None)
+    # Command line arguments take precedence over the config file, settings of a job over both
+    config.update({key: value for key, value in vars(arguments).items()
+                   if key not in ('config', 'yes') and value is not None})
 
+    if jobs is not None:
+        if not arguments.yes:
+            check = input(f"{len(jobs)} Jobs parallel starten? (ja / nein)")
+            if check != "ja":
+                sys.exit()
+        return 1 if run_jobs([{**config, **job} for job in jobs]) else 0
 
-def main():
-    """Main function to run the script."""
     try:
+        apply_config(config)
         # Step 0: Sicherheitsabfrage
-        check = input("Hast du bei erneutem Durchlauf die _out.xml Datei eingefügt? (ja / nein)")
-        if check != "ja":
-            sys.exit()
+        if arguments.yes:
+            if PROVIDER == 'straico' and not MODEL:
+                print("Unattended runs with 'straico' need --model, the model dialog cannot be shown.")
+                return 2
+        else:
+            check = input("Hast du bei erneutem Durchlauf die _out.xml Datei eingefügt? (ja / nein)")
+            if check != "ja":
+                sys.exit()
 
         # Step 1: Set up logging
         configure_logging()
         print("Logging configured.")
+        configure_profiling(PROCESS_LOG_FILE, PROFILE, PROFILE_MEMORY)
 
         # Step 2: Configure API
-        model = configure_api()
+        with profile_stage('configure_api'):
+            model = configure_api()
         print("API configured successfully.")
 
         # Step 3: Process files
-        process_files(PROCESSING_MODE, model)
+        with profile_stage(PROCESSING_MODE):
+            process_files(PROCESSING_MODE, model, REPAIR_FAILED_UNITS)
         print("Processing completed successfully.")
+        return 0
 
     except Exception as e:
         print(f"An error occurred: {e}")
         print("The script will resume from the last checkpoint when restarted.")
+        return 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
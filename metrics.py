@@ -0,0 +1,118 @@
+'''Messwerte eines Verarbeitungslaufs: Dauer, Wortzahlen und Ergebnis jedes Aufrufs des LLM sowie die Zahl der
+verarbeiteten Einheiten (Textabschnitte bzw. Artikel). Alle METRICS_INTERVAL Sekunden wird eine Zusammenfassung
+(Anfragen pro Minute, Latenz p50/p95, Wiederholungsrate, Restzeit) in der Konsole ausgegeben und in die
+_metrics.txt-Datei geschrieben.'''
+
+import time
+import threading
+from datetime import datetime, timedelta
+from collections import Counter
+
+METRICS_INTERVAL = 60  # Seconds between two summaries
+
+
+def percentile(sorted_values, share):
+    """Nearest-rank percentile of an ascending list; None for an empty list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+
+def format_duration(seconds):
+    return str(timedelta(seconds=round(seconds)))
+
+
+class Metrics:
+    """
+    Collects the measurements of one run. The module-level instance `metrics` is shared by main.py and the
+    process_* modules; all methods may be called from worker threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start()
+
+    def start(self, metrics_file=None):
+        """Starts a new run whose summaries are written to metrics_file (None: console only)."""
+        with self.lock:
+            self.metrics_file = metrics_file
+            self.start_time = time.monotonic()
+            self.last_report = self.start_time
+            self.latencies = []  # Seconds per successful call
+            self.outcomes = Counter()  # 'success', 'error' (exception returned as text), 'failed' (retries exhausted)
+            self.attempts = 0
+            self.words_in = 0
+            self.words_out = 0
+            self.total = None
+            self.done = 0
+            self.skipped = 0
+
+    def set_total(self, total):
+        """Sets the number of units of the run."""
+        with self.lock:
+            self.total = total
+
+    def record_call(self, duration, words_in, words_out, outcome, attempts):
+        """Records one call of generate_content_with_retries()."""
+        with self.lock:
+            if outcome == 'success':
+                self.latencies.append(duration)
+            self.outcomes[outcome] += 1
+            self.attempts += attempts
+            self.words_in += words_in
+            self.words_out += words_out
+        self.report_if_due()
+
+    def unit_done(self, skipped=False):
+        """Records a processed unit; skipped units (e.g. from the checkpoint) do not count for the rate."""
+        with self.lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.done += 1
+        self.report_if_due()
+
+    def report_if_due(self):
+        with self.lock:
+            due = time.monotonic() - self.last_report >= METRICS_INTERVAL
+            if due:
+                self.last_report = time.monotonic()
+        if due:
+            self.report()
+
+    def summary(self):
+        """Returns the summary of the run so far as a list of lines."""
+        with self.lock:
+            elapsed = time.monotonic() - self.start_time
+            latencies = sorted(self.latencies)
+            calls = sum(self.outcomes.values())
+            minutes = max(elapsed, 1e-9) / 60
+            lines = [
+                f"Stand: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, Laufzeit: {format_duration(elapsed)}",
+                f"Units: {self.done} processed, {self.skipped} skipped"
+                + (f", {self.total} total" if self.total is not None else ""),
+                f"Requests: {calls} ({calls / minutes:.1f}/min), "
+                + ", ".join(f"{outcome}: {count}" for outcome, count in sorted(self.outcomes.items())),
+                f"Retry rate: {(self.attempts - calls) / calls:.1%}" if calls else "Retry rate: -",
+                f"Words: {self.words_in} in ({self.words_in / minutes:.0f}/min), {self.words_out} out",
+            ]
+            if latencies:
+                lines.append(f"Latency: p50 {percentile(latencies, 0.5):.1f} s, p95 {percentile(latencies, 0.95):.1f} s, "
+                             f"max {latencies[-1]:.1f} s")
+            if self.total is not None and self.done:
+                remaining = max(0, self.total - self.done - self.skipped)
+                eta = remaining * elapsed / self.done
+                lines.append(f"ETA: {format_duration(eta)} for {remaining} units "
+                             f"(until {(datetime.now() + timedelta(seconds=eta)).strftime('%Y-%m-%d %H:%M')})")
+        return lines
+
+    def report(self):
+        """Prints the summary and rewrites the metrics file."""
+        lines = self.summary()
+        print("\n--- Metrics ---\n" + "\n".join(lines) + "\n---------------")
+        if self.metrics_file:
+            with open(self.metrics_file, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+
+
+metrics = Metrics()
@@ -1,12 +1,15 @@
 import os
-import time
 import json
 import logging
 from nltk.tokenize import sent_tokenize
-from main import generate_content_with_retries
+from main import (generate_content_with_retries, map_unordered, max_words_per_request, print_unit_texts,
+                  print_progress, served_by, deduplicated_from, deadline_reached, CallTimeout)
+from metrics import metrics
+from profiling import profile_stage
+from dedup import Deduplicator, report as report_duplicates
 
 # Configuration variables
-WORDS_PER_CHUNK = 500
+WORDS_PER_CHUNK = 500  # Used when the limits of the selected model are unknown
 
 
 def get_prompt():
@@ -32,7 +35,14 @@ def split_text(text, words_per_chunk):
 
     for sentence in sentences:
         words = sentence.split()
-        if current_word_count + len(words) > words_per_chunk:
+        # Sentences longer than a chunk are split at word boundaries
+        while len(words) > words_per_chunk:
+            if current_chunk:
+                chunks.append(" ".join(current_chunk))
+                current_chunk, current_word_count = [], 0
+            chunks.append(" ".join(words[:words_per_chunk]))
+            words = words[words_per_chunk:]
+        if current_chunk and current_word_count + len(words) > words_per_chunk:
             chunks.append(" ".join(current_chunk))
             current_chunk, current_word_count = words, len(words)
         else:
@@ -64,66 +74,114 @@ def save_as_md(text, filename):
     print(f"Response saved as Markdown file under: {new_filename}")
 
 
-def process_text_file(PROVIDER, model, INPUT_FILE, directory_path, OUTPUT_FILE):
+def process_chunk(PROVIDER, model, i, chunk, total, words_per_chunk=WORDS_PER_CHUNK, deduplicator=None):
+    """
+    Sends one chunk to the AI model and returns its response text and log entry. With a deduplicator,
+    identical chunks are sent only once.
+    """
+    error_message = ""
+    response_text = ""
+    print_progress(f"Generating response for section {i + 1}/{total}...")
+    try:
+        if deduplicator:
+            response_text, reused = deduplicator.run(
+                chunk, lambda: generate_content_with_retries(PROVIDER, model, chunk, get_prompt()), unit=i + 1)
+            if reused:
+                print_progress(f"Response of section {deduplicated_from()} reused for section {i + 1}.")
+        else:
+            response_text = generate_content_with_retries(PROVIDER, model, chunk, get_prompt())
+        if response_text:
+            print_unit_texts("chunk", chunk, "response_text", response_text)
+            response = response_text
+            print_progress(f"Response generated for section {i + 1}.")
+        else:
+            error_message = f"!!! Section {i + 1} did not return valid parts."
+            print(error_message)
+            response = error_message
+    except CallTimeout as e:
+        error_message = f"!!! Section {i + 1} not processed: {e}"
+        print(error_message)
+        response = error_message
+    except AttributeError:
+        error_message = f"!!! AttributeError: Response object has no 'parts' attribute in section {i + 1}."
+        print(error_message)
+        response = error_message
+    except ValueError as e:
+        error_message = f"!!! Error processing section {i + 1}: {e}"
+        print(error_message)
+        response = error_message
+    except Exception as e:
+        error_message = f"!!! Unexpected error in section {i + 1}: {e}"
+        print(error_message)
+        response = error_message
+
+    log_entry = {
+        "chunk_id": i + 1,
+        "chunk_size": words_per_chunk,
+        "status": "error" if error_message else "success",
+        "message": error_message,
+        "content": chunk,
+        "response": response_text
+    }
+    if served_by():
+        log_entry["provider"] = served_by()
+    if deduplicated_from():
+        log_entry["dedup_of"] = deduplicated_from()
+    return response, log_entry
+
+
+def process_text_file(PROVIDER, model, INPUT_FILE, directory_path, OUTPUT_FILE, concurrency=1, limits=None,
+                      deduplicate=False):
     print(f"\n=== Processing file: {INPUT_FILE} ===")
     print("Reading file content...")
     with open(INPUT_FILE, 'r', encoding='utf-8', errors='ignore') as f:
         content = f.read()
     print("File content read.")
 
-    text_chunks = split_text(content, WORDS_PER_CHUNK)
+    # Size the chunks from the limits of the selected model
+    words_per_chunk = max_words_per_request(limits, get_prompt()) or WORDS_PER_CHUNK
+    with profile_stage('split_text'):
+        text_chunks = split_text(content, words_per_chunk)
     print(f"Text split into {len(text_chunks)} sections.")
+    metrics.set_total(len(text_chunks))
 
-    responses = []
-    for i, chunk in enumerate(text_chunks):
-        error_message = ""
-        response_text = ""
-        print(f"Generating response for section {i + 1}/{len(text_chunks)}...")
-        try:
-            time.sleep(1)
-            response_text = generate_content_with_retries(PROVIDER, model, chunk, get_prompt())
-            if response_text:
-                print("chunk: ")
-                print(chunk)
-                print()
-                print("response_text: ")
-                print(response_text)
-                responses.append(response_text)
-                print(f"Response generated for section {i + 1}.")
-            else:
-                error_message = f"!!! Section {i + 1} did not return valid parts."
-                print(error_message)
-                responses.append(error_message)
-        except AttributeError:
-            error_message = f"!!! AttributeError: Response object has no 'parts' attribute in section {i + 1}."
-            print(error_message)
-            responses.append(error_message)
-        except ValueError as e:
-            error_message = f"!!! Error processing section {i + 1}: {e}"
-            print(error_message)
-            responses.append(error_message)
-        except Exception as e:
-            error_message = f"!!! Unexpected error in section {i + 1}: {e}"
-            print(error_message)
-            responses.append(error_message)
+    # Chunks are independent, so they may be answered out of order; each response
+    # is stored at its chunk position and the text is reassembled in chunk order.
+    responses = [None] * len(text_chunks)
+    deduplicator = Deduplicator() if deduplicate else None
+
+    def process(item):
+        return process_chunk(PROVIDER, model, item[0], item[1], len(text_chunks), words_per_chunk, deduplicator)
+
+    for i, (response, log_entry) in map_unordered(process, enumerate(text_chunks), concurrency, deadline_reached):
+        responses[i] = response
 
         # Logging
-        log_entry = {
-            "chunk_id": i + 1,
-            "chunk_size": WORDS_PER_CHUNK,
-            "status": "error" if error_message else "success",
-            "message": error_message,
-            "content": chunk,
-            "response": response_text
-        }
         logging.info(json.dumps(log_entry, ensure_ascii=False))
+        metrics.unit_done()
+
+    # Sections not started before the run deadline are logged as failed, so REPAIR_FAILED_UNITS sends them later
+    missing = [i for i, response in enumerate(responses) if response is None]
+    if missing:
+        print(f"Run deadline reached: {len(missing)} sections were not started; repair the output with "
+              f"REPAIR_FAILED_UNITS to process them.")
+    for i in missing:
+        responses[i] = f"!!! Section {i + 1} not processed before the run deadline."
+        logging.info(json.dumps({
+            "chunk_id": i + 1,
+            "chunk_size": words_per_chunk,
+            "status": "error",
+            "message": responses[i],
+            "content": text_chunks[i],
+            "response": ""
+        }, ensure_ascii=False))
 
     # Concatenate responses to one single string.
     responses_str = "\n\n".join(responses)
 
     # Save response as MD-file
     save_as_md(responses_str, OUTPUT_FILE)
+    if deduplicator:
+        report_duplicates(text_chunks, deduplicator, os.path.splitext(OUTPUT_FILE)[0] + '_dedup.txt')
 
     print(f"=== Processing of {INPUT_FILE} completed ===\n")
-
-
@@ -1,12 +1,26 @@
 import os
 import re
+import copy
 import logging
 import json
+import threading
+from contextlib import nullcontext
 import xml.etree.ElementTree as ET
-from main import generate_content_with_retries
+from main import (generate_content_with_retries, max_words_per_request, map_unordered, print_unit_texts,
+                  print_progress, served_by, deadline_reached, CallTimeout)
+from metrics import metrics
+from profiling import profile_stage
+from scheduling import map_longest_first, adopt
+from incremental import select_articles, input_hash, output_hash
+from repair_xml import parse_response
 
 MIN_WORDS_ARTICLE = 50
 
+# Guards changes to the XML tree against concurrent writes of the output file
+tree_lock = threading.Lock()
+# Guards the checkpoint against concurrent updates by articles processed at the same time
+checkpoint_lock = threading.Lock()
+
 
 def get_prompt():
     return '''Du bist ein KI-Assistent, als professioneller Lektor lektorierst du ein Lexikon.
@@ -45,9 +59,10 @@ def save_checkpoint(checkpoint_file, processed_articles):
         json.dump(processed_articles, f, ensure_ascii=False)
 
 
-def update_checkpoint(checkpoint_file, processed_articles, article_id):
-    processed_articles[article_id] = True
-    save_checkpoint(checkpoint_file, processed_articles)
+def update_checkpoint(checkpoint_file, processed_articles, article_id, hashes=None):
+    with checkpoint_lock:
+        processed_articles[article_id] = hashes or True
+        save_checkpoint(checkpoint_file, processed_articles)
 
 def convert_headline_in_xml():
     # '< p field = "heading" class ="headX" > Neue Unter-Überschrift < / p >'
@@ -69,41 +84,199 @@ def remove_redundant_article_tags(element):
             remove_redundant_article_tags(child)
 
 
-def process_article(PROVIDER, model, article, processed_articles, checkpoint_file):
+def get_part_note(index, total):
+    """Returns the note appended to the prompt when an article is sent in several parts."""
+    return (f"\n\nHinweis: Dies ist Teil {index + 1} von {total} eines längeren lexikalischen Eintrags. "
+            "Füge eine Schlagzeile nur dort ein, wo ein neues Thema beginnt, nicht allein wegen des Teilanfangs.")
+
+
+def count_words(element):
+    return len(ET.tostring(element, encoding='unicode', method='xml').split())
+
+
+def collect_segments(element, max_words, path=()):
+    """
+    Flattens an element into segments that can be sent separately. Child elements within
+    max_words, <p> elements and elements without children are segments; larger containers
+    are descended into. Each segment is returned as (path, element), path being the tuple of
+    containers between the article and the segment.
+    """
+    segments = []
+    for child in element:
+        if child.tag == 'p' or len(child) == 0 or count_words(child) <= max_words:
+            segments.append((path, child))
+        else:
+            segments.extend(collect_segments(child, max_words, path + (child,)))
+    return segments
+
+
+def split_article(article, max_words):
+    """
+    Splits an article at <p> boundaries into sub-articles of at most max_words words.
+    Containers that are cut are copied into every sub-article holding a part of them.
+
+    Returns:
+    tuple: (sub_articles, cut_depths), cut_depths[k] being the number of containers cut
+    between sub_articles[k] and sub_articles[k + 1].
+    """
+    groups, current, current_words = [], [], 0
+    for path, segment in collect_segments(article, max_words):
+        words = count_words(segment)
+        if current and current_words + words > max_words:
+            groups.append(current)
+            current, current_words = [], 0
+        current.append((path, segment))
+        current_words += words
+    if current:
+        groups.append(current)
+
+    sub_articles, cut_depths, started = [], [], set()
+    for index, group in enumerate(groups):
+        sub_article = ET.Element(article.tag, article.attrib)
+        if index == 0:
+            sub_article.text = article.text
+        else:
+            previous_path, next_path = groups[index - 1][-1][0], group[0][0]
+            depth = 0
+            while depth < min(len(previous_path), len(next_path)) and previous_path[depth] is next_path[depth]:
+                depth += 1
+            cut_depths.append(depth)
+        stack = []  # (original container, copy) of the containers currently open
+        for path, segment in group:
+            while stack and (len(stack) > len(path) or stack[-1][0] is not path[len(stack) - 1]):
+                stack.pop()
+            for container in path[len(stack):]:
+                parent = stack[-1][1] if stack else sub_article
+                container_copy = ET.SubElement(parent, container.tag, container.attrib)
+                container_copy.tail = container.tail
+                if id(container) not in started:
+                    container_copy.text = container.text
+                    started.add(id(container))
+                stack.append((container, container_copy))
+            (stack[-1][1] if stack else sub_article).append(copy.deepcopy(segment))
+        sub_articles.append(sub_article)
+    return sub_articles, cut_depths
+
+
+def join_parts(target, source, depth):
+    """Appends the content of source to target, continuing the containers cut at depth levels."""
+    children = list(source)
+    if depth and len(target) and children and target[-1].tag == children[0].tag:
+        join_parts(target[-1], children[0], depth - 1)
+        target[-1].tail = children[0].tail
+        children = children[1:]
+    elif source.text and source.text.strip():
+        if len(target):
+            target[-1].tail = (target[-1].tail or '') + source.text
+        else:
+            target.text = (target.text or '') + source.text
+    target.extend(children)
+
+
+def merge_articles(sub_articles, cut_depths):
+    """Joins the responses to the sub-articles of split_article() into one article."""
+    article = sub_articles[0]
+    for sub_article, depth in zip(sub_articles[1:], cut_depths):
+        join_parts(article, sub_article, depth)
+    return article
+
+
+# A headline followed only by closing tags at the end of a response
+pattern_trailing_headline = re.compile(r'\s*(\{\{[^{}]+\}\})((?:\s*</[^>]+>)*\s*)$')
+# The opening tags before the first text of a response
+pattern_leading_tags = re.compile(r'^(\s*(?:<[^/!?][^>]*>\s*)*)')
+
+
+def carry_headlines(responses):
+    """
+    Moves a headline that ends one part to the start of the next part, so that it stays in front
+    of the text it belongs to. If the next part already starts with a headline, it is dropped.
+    """
+    responses = list(responses)
+    for index in range(len(responses) - 1):
+        match = pattern_trailing_headline.search(responses[index])
+        if not match:
+            continue
+        responses[index] = responses[index][:match.start()] + match.group(2)
+        following = responses[index + 1]
+        position = pattern_leading_tags.match(following).end()
+        if not following[position:].startswith('{{'):
+            responses[index + 1] = following[:position] + match.group(1) + ' ' + following[position:]
+    return responses
+
+
+def process_article(PROVIDER, model, article, processed_articles, checkpoint_file, max_words=None, concurrency=1,
+                    request_slots=None):
     article_id = article.get('id')
     if article_id in processed_articles:
-        print(f"Skipping already processed article: {article_id}")
+        print_progress(f"Skipping already processed article: {article_id}")
         return False
 
-    print(f"\nProcessing article ID: {article_id}")
+    print_progress(f"\nProcessing article ID: {article_id}")
+    hashes = {'input': input_hash(article)}
 
     content = ET.tostring(article, encoding='unicode', method='xml')
     content_text = get_text(article)
 
-    print("\n*** NEW ARTICLE ***")
+    print_progress("\n*** NEW ARTICLE ***")
     if len(content_text.split()) > MIN_WORDS_ARTICLE:
-        response = generate_content_with_retries(PROVIDER, model, content, get_prompt())
-        response_text = re.sub(r'<[^>]+>', '', response)
-        print("content_text: ")
-        print(content_text)
-        print()
-        print("response_text: ")
-        print(response_text)
-        article.clear()
+        # Articles exceeding the model limits are split at <p> boundaries and sent concurrently
+        if max_words and len(content.split()) > max_words:
+            sub_articles, cut_depths = split_article(article, max_words)
+            print_progress(f"Article exceeds {max_words} words, split into {len(sub_articles)} requests.")
+        else:
+            sub_articles, cut_depths = [article], []
+
+        providers = set()  # Routes that answered the parts
+
+        def request(index):
+            part = content if len(sub_articles) == 1 else ET.tostring(sub_articles[index], encoding='unicode')
+            prompt = get_prompt() if len(sub_articles) == 1 else get_prompt() + get_part_note(index, len(sub_articles))
+            # Several articles may split at the same time; the slots keep the requests within the concurrency
+            with request_slots or nullcontext():
+                response = generate_content_with_retries(PROVIDER, model, part, prompt)
+            if served_by():
+                providers.add(served_by())
+            return response
+
+        responses = [None] * len(sub_articles)
         try:
-            response_element = ET.fromstring(response)
-            article.append(response_element)
-            log_text = "Article processed successfully."
-            print(log_text)
-            modified = True
-        except Exception as e:
-            article.append(ET.fromstring(content))  # Keep original content
+            for index, part_response in map_unordered(request, range(len(sub_articles)), concurrency):
+                responses[index] = part_response
+        except CallTimeout as e:
+            # The article keeps its original content and is logged as failed
+            response = response_text = ""
             log_text = f"An error occurred in process_article(): {e} - Keep original content from xml-file"
             print(log_text)
             modified = False
+        else:
+            responses = carry_headlines(responses)
+            response = "\n".join(responses)
+            response_text = re.sub(r'<[^>]+>', '', response)
+            print_unit_texts("content_text", content_text, "response_text", response_text)
+            try:
+                parsed = [parse_response(part, 'article') for part in responses]
+                response_element = merge_articles([element for element, _ in parsed], cut_depths)
+                with tree_lock:
+                    article.clear()
+                    article.append(response_element)
+                repair = '+'.join(sorted({fixes for _, fixes in parsed if fixes}))
+                if repair:
+                    log_text = f"Article processed successfully after local repair: {repair}"
+                else:
+                    log_text = "Article processed successfully."
+                print_progress(log_text)
+                modified = True
+            except Exception as e:
+                with tree_lock:
+                    article.clear()
+                    article.append(ET.fromstring(content))  # Keep original content
+                log_text = f"An error occurred in process_article(): {e} - Keep original content from xml-file"
+                print(log_text)
+                modified = False
     else:
         log_text = "Article too short, skipped processing."
-        print(log_text)
+        print_progress(log_text)
         modified = True  # Considered as processed, so we can update the checkpoint
 
     log_entry = {
@@ -115,28 +288,66 @@ def process_article(PROVIDER, model, article, processed_articles, checkpoint_fil
         "content": content,
         "response": response if 'response' in locals() else "N/A"
     }
+    if locals().get('repair'):
+        log_entry["repair"] = repair
+    if locals().get('providers'):
+        log_entry["provider"] = '+'.join(sorted(providers))
 
     logging.info(json.dumps(log_entry, ensure_ascii=False))
 
     if modified:
-        update_checkpoint(checkpoint_file, processed_articles, article_id)
+        hashes['output'] = output_hash(article)
+        update_checkpoint(checkpoint_file, processed_articles, article_id, hashes)
 
     return modified
 
 
-def process_xml_file(PROVIDER, model, file_path: str, checkpoint_file, output_file, start_article=0) -> ET.Element:
+def process_xml_file(PROVIDER, model, file_path: str, checkpoint_file, output_file, start_article=0,
+                     limits=None, concurrency=1) -> ET.Element:
     print(f"Processing XML file: {file_path}")
+    max_words = max_words_per_request(limits, get_prompt())
     parser = ET.XMLParser(encoding="utf-8")
-    tree = ET.parse(file_path, parser=parser)
+    with profile_stage('parse_input'):
+        tree = ET.parse(file_path, parser=parser)
     root = tree.getroot()
     processed_articles = load_checkpoint(checkpoint_file)
     articles = root.findall('.//article')
+    metrics.set_total(len(articles) - start_article)
+
+    # Unchanged articles of a new export are copied from the previous output, changed ones are sent again
+    pending, counts = select_articles(list(enumerate(articles[start_article:], start=start_article + 1)),
+                                      processed_articles, output_file)
+    for _ in range(len(articles) - start_article - len(pending)):
+        metrics.unit_done(skipped=True)
+    if counts['copied']:
+        with tree_lock:
+            remove_redundant_article_tags(root)
+            tree.write(output_file, encoding='utf-8', xml_declaration=True)
+
+    # Articles are processed concurrently, the longest first; the parts of a split article share the slots
+    request_slots = threading.BoundedSemaphore(max(1, concurrency))
+
+    def work(item):
+        idx, article = item
+        print_progress(f"Article Nr.: {idx}")
+        # The article is processed on a copy, so the output file only receives finished articles
+        working_copy = copy.deepcopy(article)
+        return working_copy, process_article(PROVIDER, model, working_copy, processed_articles, checkpoint_file,
+                                             max_words, concurrency, request_slots)
 
-    for idx, article in enumerate(articles[start_article:], start=start_article + 1):
-        print(f"Article Nr.: {idx}")
-        if process_article(PROVIDER, model, article, processed_articles, checkpoint_file):
+    costs = [len(get_text(article).split()) for _, article in pending]
+    finished = 0
+    for index, (working_copy, _) in map_longest_first(work, pending, costs, concurrency, deadline_reached):
+        finished += 1
+        # Also adopted if the article failed: it kept its original content and is repaired from the log
+        with tree_lock:
+            adopt(pending[index][1], working_copy)
             remove_redundant_article_tags(root)
             tree.write(output_file, encoding='utf-8', xml_declaration=True)
-            print(f"XML file has been updated: {output_file}")
+        print_progress(f"XML file has been updated: {output_file}")
+        metrics.unit_done()
+    if finished < len(pending):
+        print(f"Run deadline reached: {len(pending) - finished} articles were not started; they are processed "
+              f"on the next run (checkpoint: {checkpoint_file})")
     print(f"XML file has been processed successfully: {file_path}")
-    return root
\ No newline at end of file
+    return root
@@ -1,13 +1,27 @@
 import os
 import re
 import logging
+import copy
 import json
+import threading
 import xml.etree.ElementTree as ET
-from main import generate_content_with_retries
+from main import (generate_content_with_retries, print_unit_texts, print_progress, served_by, deduplicated_from,
+                  deadline_reached, CallTimeout)
+from metrics import metrics
+from profiling import profile_stage
+from scheduling import map_longest_first, adopt
+from incremental import select_articles, input_hash, output_hash
+from dedup import Deduplicator, report as report_duplicates
+from repair_xml import parse_response
 
 # Constants
 MIN_WORDS_PARAGRAPH = 5  # Minimum number of words for a paragraph to be processed
 
+# Guards changes to the XML tree against concurrent writes of the output file
+tree_lock = threading.Lock()
+# Guards the checkpoint against concurrent updates by articles processed at the same time
+checkpoint_lock = threading.Lock()
+
 
 def get_prompt():
     """
@@ -74,7 +88,7 @@ def save_checkpoint(checkpoint_file, processed_articles):
         json.dump(processed_articles, f, ensure_ascii=False)
 
 
-def update_checkpoint(checkpoint_file, processed_articles, article_id):
+def update_checkpoint(checkpoint_file, processed_articles, article_id, hashes=None):
     """
     Updates the checkpoint file with a newly processed article.
 
@@ -82,9 +96,11 @@ def update_checkpoint(checkpoint_file, processed_articles, article_id):
     checkpoint_file (str): Path to the checkpoint file.
     processed_articles (dict): Dictionary of processed articles.
     article_id (str): ID of the newly processed article.
+    hashes (dict): 'input' and 'output' hash of the article (see incremental.py).
     """
-    processed_articles[article_id] = True
-    save_checkpoint(checkpoint_file, processed_articles)
+    with checkpoint_lock:
+        processed_articles[article_id] = hashes or True
+        save_checkpoint(checkpoint_file, processed_articles)
 
 
 def remove_redundant_p_tags(element):
@@ -107,49 +123,66 @@ def remove_redundant_p_tags(element):
             remove_redundant_p_tags(child)
 
 
-def process_paragraph(PROVIDER, model, paragraph):
+def process_paragraph(PROVIDER, model, paragraph, deduplicator=None, unit=None):
     """
     Processes a single paragraph using the AI model.
 
     Args:
     model: The AI model used for content generation.
     paragraph (ET.Element): The paragraph XML element to process.
+    deduplicator (Deduplicator): Shares the response of identical paragraphs; None sends every paragraph.
+    unit (str): ID of the article, logged as "dedup_of" with the paragraphs that reuse this response.
 
     Returns:
     tuple: A tuple containing processing status, log text, and other relevant information.
+    The last item names the local repair applied to the response (None if no repair was needed).
     """
 
     content = ET.tostring(paragraph, encoding='unicode', method='xml')
     content_text = get_text(paragraph)
-    print("\n*** NEW PARAGRAPH ***")
+    print_progress("\n*** NEW PARAGRAPH ***")
     if len(content_text.split()) > MIN_WORDS_PARAGRAPH:
-        response = generate_content_with_retries(PROVIDER, model, content, get_prompt())
-        response_text = re.sub(r'<[^>]+>', '', response)
-        print("content_text: ")
-        print(content_text)
-        print()
-        print("response_text: ")
-        print(response_text)
-        paragraph.clear()
         try:
-            response_element = ET.fromstring(response)
-            paragraph.append(response_element)
-            log_text = "Paragraph processed successfully."
+            if deduplicator:
+                response, reused = deduplicator.run(
+                    content, lambda: generate_content_with_retries(PROVIDER, model, content, get_prompt()),
+                    unit=unit)
+                if reused:
+                    print_progress(f"Response of an identical paragraph of article {deduplicated_from()} reused.")
+            else:
+                response = generate_content_with_retries(PROVIDER, model, content, get_prompt())
+        except CallTimeout as e:
+            # The paragraph keeps its original content and is logged as failed
+            log_text = f"An error occurred in process_paragraph(): {e} - Keep original content from xml-file"
             print(log_text)
-            return True, log_text, content_text, response_text, content, response
+            return False, log_text, content_text, "", content, "", None
+        response_text = re.sub(r'<[^>]+>', '', response)
+        print_unit_texts("content_text", content_text, "response_text", response_text)
+        try:
+            response_element, repair = parse_response(response, paragraph.tag)
+            if repair:
+                log_text = f"Paragraph processed successfully after local repair: {repair}"
+            else:
+                log_text = "Paragraph processed successfully."
+            modified = True
+            print_progress(log_text)
         except Exception as e:
-            response_element = ET.fromstring(content)
-            paragraph.append(response_element)
+            response_element, repair = ET.fromstring(content), None
             log_text = f"An error occurred in process_paragraph(): {e} - Keep original content from xml-file"
+            modified = False
             print(log_text)
-            return False, log_text, content_text, response_text, content, response
+        # Paragraphs may be processed by several threads while the tree is written
+        with tree_lock:
+            paragraph.clear()
+            paragraph.append(response_element)
+        return modified, log_text, content_text, response_text, content, response, repair
     else:
         log_text = "Paragraph too short, skipped processing."
-        print(log_text)
-        return True, log_text, content_text, "N/A", content, "N/A"
+        print_progress(log_text)
+        return True, log_text, content_text, "N/A", content, "N/A", None
 
 
-def process_article(PROVIDER, model, article, processed_articles, checkpoint_file):
+def process_article(PROVIDER, model, article, processed_articles, checkpoint_file, deduplicator=None):
     """
     Processes a single article, updating its paragraphs.
 
@@ -158,21 +191,23 @@ def process_article(PROVIDER, model, article, processed_articles, checkpoint_fil
     article (ET.Element): The article XML element to process.
     processed_articles (dict): Dictionary of processed articles.
     checkpoint_file (str): Path to the checkpoint file.
+    deduplicator (Deduplicator): Shares the response of identical paragraphs.
 
     Returns:
     bool: True if the article was modified, False otherwise.
     """
     article_id = article.get('id')
     if article_id in processed_articles:
-        print(f"Skipping already processed article: {article_id}")
+        print_progress(f"Skipping already processed article: {article_id}")
         return False
 
-    print(f"\nProcessing article ID: {article_id}")
+    print_progress(f"\nProcessing article ID: {article_id}")
     article_modified = True
+    hashes = {'input': input_hash(article)}
 
     for paragraph in article.findall('.//p'):
-        modified, log_text, content_text, response_text, content, response = process_paragraph(
-            PROVIDER, model, paragraph
+        modified, log_text, content_text, response_text, content, response, repair = process_paragraph(
+            PROVIDER, model, paragraph, deduplicator, article_id
         )
         if not modified:
             article_modified = False
@@ -186,15 +221,24 @@ def process_article(PROVIDER, model, article, processed_articles, checkpoint_fil
             "content": content,
             "response": response
         }
+        if repair:
+            log_entry["repair"] = repair
+        # Short paragraphs are not sent, the route of the previous request does not apply to them
+        if served_by() and response != "N/A":
+            log_entry["provider"] = served_by()
+        if deduplicated_from() and response != "N/A":
+            log_entry["dedup_of"] = deduplicated_from()
         logging.info(json.dumps(log_entry, ensure_ascii=False))
 
     if article_modified:
-        update_checkpoint(checkpoint_file, processed_articles, article_id)
+        hashes['output'] = output_hash(article)
+        update_checkpoint(checkpoint_file, processed_articles, article_id, hashes)
 
     return article_modified
 
 
-def process_xml_file(PROVIDER, model, INPUT_FILE: str, checkpoint_file, output_file, start_article=0) -> ET.Element:
+def process_xml_file(PROVIDER, model, INPUT_FILE: str, checkpoint_file, output_file, start_article=0,
+                     concurrency=1, deduplicate=False) -> ET.Element:
     """
     Main function to process the XML file.
 
@@ -204,22 +248,60 @@ def process_xml_file(PROVIDER, model, INPUT_FILE: str, checkpoint_file, output_f
     checkpoint_file (str): Path to the checkpoint file.
     output_file (str): Path to the output XML file.
     start_article (int): The index of the article to start processing from.
+    concurrency (int): Number of articles processed at the same time, the longest first.
+    deduplicate (bool): Send identical paragraphs only once and report near-duplicates.
 
     Returns:
     ET.Element: The root element of the processed XML tree.
     """
     print(f"Processing XML file: {INPUT_FILE}")
     parser = ET.XMLParser(encoding="utf-8")
-    tree = ET.parse(INPUT_FILE, parser=parser)
+    with profile_stage('parse_input'):
+        tree = ET.parse(INPUT_FILE, parser=parser)
     root = tree.getroot()
     processed_articles = load_checkpoint(checkpoint_file)
     articles = root.findall('.//article')
+    metrics.set_total(len(articles) - start_article)
+
+    # Unchanged articles of a new export are copied from the previous output, changed ones are sent again
+    pending, counts = select_articles(list(enumerate(articles[start_article:], start=start_article + 1)),
+                                      processed_articles, output_file)
+    for _ in range(len(articles) - start_article - len(pending)):
+        metrics.unit_done(skipped=True)
+    if counts['copied']:
+        with tree_lock:
+            remove_redundant_p_tags(root)
+            tree.write(output_file, encoding='utf-8', xml_declaration=True)
 
-    for idx, article in enumerate(articles[start_article:], start=start_article + 1):
-        print(f"Article Nr.: {idx}")
-        if process_article(PROVIDER, model, article, processed_articles, checkpoint_file):
+    deduplicator = Deduplicator() if deduplicate else None
+    # The near-duplicate report covers the input paragraphs; the articles are replaced by their output below
+    paragraphs = [ET.tostring(paragraph, encoding='unicode') for _, article in pending
+                  for paragraph in article.findall('.//p')
+                  if len(get_text(paragraph).split()) > MIN_WORDS_PARAGRAPH] if deduplicator else []
+
+    def work(item):
+        idx, article = item
+        print_progress(f"Article Nr.: {idx}")
+        # The article is processed on a copy, so the output file only receives finished articles
+        working_copy = copy.deepcopy(article)
+        return working_copy, process_article(PROVIDER, model, working_copy, processed_articles, checkpoint_file,
+                                             deduplicator)
+
+    costs = [len(get_text(article).split()) for _, article in pending]
+    finished = 0
+    for index, (working_copy, _) in map_longest_first(work, pending, costs, concurrency, deadline_reached):
+        finished += 1
+        # Also adopted if a paragraph failed: it kept its original content and is repaired from the log
+        with tree_lock:
+            adopt(pending[index][1], working_copy)
             remove_redundant_p_tags(root)
             tree.write(output_file, encoding='utf-8', xml_declaration=True)
-            print(f"XML file has been updated: {output_file}")
+        print_progress(f"XML file has been updated: {output_file}")
+        metrics.unit_done()
+    if deduplicator:
+        report_duplicates(paragraphs, deduplicator, os.path.splitext(output_file)[0] + '_dedup.txt')
+    if finished < len(pending):
+        print(f"Run deadline reached: {len(pending) - finished} articles were not started; they are processed "
+              f"on the next run (checkpoint: {checkpoint_file})")
     print(f"XML file has been processed successfully: {INPUT_FILE}")
     return root
@@ -0,0 +1,103 @@
+'''Profiling einzelner Verarbeitungsschritte. profile_stage() misst einen Schritt mit cProfile (Rechenzeit je
+Funktion) und/oder tracemalloc (Speicherspitze und größte Allokationen) und schreibt je Schritt einen Bericht
+<Basisdatei>_profile_<Schritt>.txt sowie die Rohdaten <...>.prof (z.B. für snakeviz) neben die Basisdatei.
+Ineinander geschachtelte Schritte werden getrennt ausgewiesen; der äußere Profiler pausiert solange.
+Ist das Profiling ausgeschaltet, kostet profile_stage() nur einen Funktionsaufruf.
+
+Hinweis: cProfile erfasst nur den Thread, der den Schritt ausführt. Bei CONCURRENCY > 1 erscheinen die
+LLM-Aufrufe der Worker-Threads nur als Wartezeit in map_unordered(); für eine Aufschlüsselung mit
+CONCURRENCY = 1 profilieren.'''
+
+import os
+import io
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+TOP_FUNCTIONS = 30  # Number of functions listed per sort order
+TOP_ALLOCATIONS = 20  # Number of source lines with the largest allocations
+
+settings = {'base_file': None, 'cpu': False, 'memory': False}
+stack = []  # Open stages: dicts with their profiler and memory peak
+
+
+def configure_profiling(base_file, cpu=False, memory=False):
+    """
+    Switches profiling on or off for the following stages.
+
+    Args:
+    base_file (str): Reports are written next to this file, e.g. the _process.log file.
+    cpu (bool): Profile the run time per function with cProfile.
+    memory (bool): Record the memory peak and the largest allocations with tracemalloc.
+    """
+    settings.update(base_file=base_file, cpu=cpu, memory=memory)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def report_file(name, extension):
+    return f"{os.path.splitext(settings['base_file'])[0]}_profile_{name}{extension}"
+
+
+@contextmanager
+def profile_stage(name):
+    """Profiles the enclosed code as stage `name` if profiling is configured."""
+    if not (settings['cpu'] or settings['memory']) or not settings['base_file']:
+        yield
+        return
+
+    outer = stack[-1] if stack else None
+    if outer and outer['profiler']:
+        outer['profiler'].disable()
+    if settings['memory']:
+        if outer:
+            outer['peak'] = max(outer['peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    stage = {'name': name, 'profiler': cProfile.Profile() if settings['cpu'] else None, 'peak': 0,
+             'start_memory': tracemalloc.get_traced_memory()[0] if settings['memory'] else 0}
+    stack.append(stage)
+    start = time.perf_counter()
+    if stage['profiler']:
+        stage['profiler'].enable()
+    try:
+        yield
+    finally:
+        if stage['profiler']:
+            stage['profiler'].disable()
+        duration = time.perf_counter() - start
+        stack.pop()
+        snapshot = None
+        if settings['memory']:
+            stage['peak'] = max(stage['peak'], tracemalloc.get_traced_memory()[1])
+            snapshot = tracemalloc.take_snapshot()
+        write_report(stage, duration, snapshot)
+        if outer:
+            if settings['memory']:
+                # The peak of the inner stage also counts for the outer one
+                outer['peak'] = max(outer['peak'], stage['peak'])
+                tracemalloc.reset_peak()
+            if outer['profiler']:
+                outer['profiler'].enable()
+
+
+def write_report(stage, duration, snapshot):
+    lines = [f"Stage: {stage['name']}", f"Duration: {duration:.3f} s"]
+    if snapshot is not None:
+        lines.append(f"Memory at start: {stage['start_memory'] / 2 ** 20:.1f} MiB, "
+                     f"peak: {stage['peak'] / 2 ** 20:.1f} MiB")
+        lines.append(f"\nLargest allocations still held at the end (top {TOP_ALLOCATIONS}):")
+        for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            lines.append(f"  {statistic}")
+    if stage['profiler']:
+        stage['profiler'].dump_stats(report_file(stage['name'], '.prof'))
+        for sort in ('cumulative', 'tottime'):
+            stream = io.StringIO()
+            pstats.Stats(stage['profiler'], stream=stream).sort_stats(sort).print_stats(TOP_FUNCTIONS)
+            lines.append(f"\nTop {TOP_FUNCTIONS} functions by {sort} time:")
+            lines.append(stream.getvalue())
+    path = report_file(stage['name'], '.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    print(f"Profile of stage '{stage['name']}' written to {path}")
@@ -0,0 +1,166 @@
+'''Verteilt die Anfragen auf mehrere Anbieter und Modelle (PROVIDER = 'router', Routen in main.ROUTES).
+Jede Anfrage geht an eine nach Gewicht zufällig gewählte, gesunde Route. Eine Route, die FAILURE_THRESHOLD
+Mal hintereinander fehlschlägt, pausiert COOLDOWN Sekunden (bei weiteren Fehlern doppelt so lange, höchstens
+MAX_COOLDOWN). Dauert eine Anfrage länger als das HEDGE_PERCENTILE der bisherigen Antwortzeiten ihrer Route,
+wird dieselbe Anfrage zusätzlich an eine andere Route geschickt und die erste Antwort verwendet. Schlägt eine
+Anfrage fehl, wird sie sofort an eine andere Route geschickt.
+Welche Route eine Einheit beantwortet hat, steht im Feld "provider" der _process.log-Datei.'''
+
+import time
+import random
+import threading
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from main import call_ai, create_model, get_model_limits, serving
+from metrics import percentile
+
+HEDGE_PERCENTILE = 0.9  # A duplicate request is sent when a call takes longer than this share of calls
+HEDGE_MIN_SAMPLES = 10  # Latencies a route needs before its calls are hedged
+LATENCY_WINDOW = 200  # Number of recent latencies per route used for the percentile
+FAILURE_THRESHOLD = 3  # Consecutive failures after which a route pauses
+COOLDOWN = 60  # Seconds a failing route pauses at first
+MAX_COOLDOWN = 900
+ROUTER_THREADS = 32  # Threads for the calls, including hedged duplicates that are still running
+
+
+class Route:
+    """A provider and model with its weight and health."""
+
+    def __init__(self, provider, model_name, weight=1):
+        self.provider = provider
+        self.model_name = model_name
+        self.model = create_model(provider, model_name)
+        self.weight = weight
+        self.name = f"{provider}:{model_name}"
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.failures = 0  # Consecutive failures
+        self.cooldown_until = 0.0
+        self.counts = Counter()  # 'served', 'failed', 'hedged'
+
+    def healthy(self, now):
+        return now >= self.cooldown_until
+
+    def hedge_delay(self):
+        """Seconds after which a call is hedged, or None while too few latencies are known."""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return percentile(sorted(self.latencies), HEDGE_PERCENTILE)
+
+
+class ProviderRouter:
+    """
+    Sends requests to the configured routes. configure_api() returns an instance for PROVIDER 'router',
+    which call_ai() passes the requests to.
+    """
+
+    def __init__(self, routes):
+        """
+        Args:
+        routes (list): dicts with 'provider', 'model' and optionally 'weight'.
+        """
+        if not routes:
+            raise ValueError("PROVIDER 'router' needs at least one entry in ROUTES")
+        self.routes = [Route(route['provider'], route['model'], route.get('weight', 1)) for route in routes]
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=ROUTER_THREADS, thread_name_prefix='router')
+
+    def limits(self):
+        """Returns the smallest known limits of all routes, so every request fits every route."""
+        known = [limits for limits in (get_model_limits(route.provider, route.model_name) for route in self.routes)
+                 if limits]
+        if not known:
+            return None
+        return {key: min(limits[key] for limits in known) for key in ('word_limit', 'max_output')}
+
+    def choose(self, exclude=()):
+        """Returns a healthy route chosen by weight; if all are pausing, the one that resumes first."""
+        now = time.monotonic()
+        with self.lock:
+            candidates = [route for route in self.routes if route not in exclude]
+            if not candidates:
+                return None
+            healthy = [route for route in candidates if route.healthy(now)]
+            if not healthy:
+                return min(candidates, key=lambda route: route.cooldown_until)
+            return random.choices(healthy, weights=[route.weight for route in healthy])[0]
+
+    def record(self, route, duration, error):
+        with self.lock:
+            if error is None:
+                route.latencies.append(duration)
+                route.failures = 0
+                route.counts['served'] += 1
+                return
+            route.failures += 1
+            route.counts['failed'] += 1
+            if route.failures >= FAILURE_THRESHOLD:
+                pause = min(MAX_COOLDOWN, COOLDOWN * 2 ** (route.failures - FAILURE_THRESHOLD))
+                route.cooldown_until = time.monotonic() + pause
+                print(f"Route {route.name} failed {route.failures} times in a row, paused for {pause} s.")
+
+    def submit(self, route, prompt, chunk):
+        def run():
+            start = time.monotonic()
+            try:
+                response = call_ai(route.provider, route.model, prompt, chunk)
+            except Exception as e:
+                self.record(route, time.monotonic() - start, e)
+                raise
+            self.record(route, time.monotonic() - start, None)
+            return response
+        return self.executor.submit(run)
+
+    def call(self, prompt, chunk):
+        """
+        Sends the request to a route, hedges slow calls and fails over on errors.
+
+        Returns:
+        str: The first successful response; the serving route is stored in main.serving.provider.
+
+        Raises:
+        Exception: The last error if every tried route failed.
+        """
+        primary = self.choose()
+        pending = {self.submit(primary, prompt, chunk): primary}
+        tried = [primary]
+        delay = primary.hedge_delay()
+        last_error = None
+        while pending:
+            done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+            delay = None
+            if not done:
+                # Slow call: hedge with another route and take whichever answers first
+                alternate = self.choose(exclude=tried)
+                if alternate is not None:
+                    with self.lock:
+                        alternate.counts['hedged'] += 1
+                    pending[self.submit(alternate, prompt, chunk)] = alternate
+                    tried.append(alternate)
+                continue
+            for future in done:
+                route = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                serving.provider = route.name
+                return response
+            if not pending:
+                # All calls so far failed: fail over to a route that was not tried yet
+                alternate = self.choose(exclude=tried)
+                if alternate is not None:
+                    pending[self.submit(alternate, prompt, chunk)] = alternate
+                    tried.append(alternate)
+        raise last_error
+
+    def report(self):
+        """Prints the requests served, failed and hedged per route."""
+        print("\n--- Routes ---")
+        with self.lock:
+            for route in self.routes:
+                latencies = sorted(route.latencies)
+                p50 = f", p50 {percentile(latencies, 0.5):.1f} s" if latencies else ""
+                print(f"{route.name}: served {route.counts['served']}, failed {route.counts['failed']}, "
+                      f"hedged {route.counts['hedged']}{p50}")
+        print("--------------")
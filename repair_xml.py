@@ -0,0 +1,125 @@
+'''Repariert fehlerhafte XML-Antworten des LLM lokal, bevor der originale Inhalt beibehalten wird.
+Die häufigsten Ursachen sind Code-Fences, einleitender Kommentar, unmaskierte "&" und ein einzelnes
+nicht geschlossenes oder überzähliges Inline-Tag. Eine Reparatur wird nur übernommen, wenn der
+Textinhalt des reparierten Elements mit dem Text der Antwort (response_text) übereinstimmt.'''
+
+import re
+import html
+import xml.etree.ElementTree as ET
+
+pattern_code_fence = re.compile(r'^\s*```[\w-]*[ \t]*\n?|\n?[ \t]*```\s*$')
+pattern_ampersand = re.compile(r'&(?!(?:[a-zA-Z][a-zA-Z0-9]*|#\d+|#x[0-9a-fA-F]+);)')
+pattern_tag = re.compile(r'<(/?)([A-Za-z_][\w:.-]*)[^<>]*?(/?)>')
+pattern_markup = re.compile(r'<[^>]+>')
+
+
+def strip_code_fence(response, root_tag):
+    """Removes a Markdown code fence (```xml ... ```) around the response."""
+    return pattern_code_fence.sub('', response)
+
+
+def strip_chatter(response, root_tag):
+    """Removes text before the opening and after the closing root tag."""
+    start = re.search(rf'<{re.escape(root_tag)}[\s/>]', response)
+    end = response.rfind(f'</{root_tag}>')
+    if not start or end < start.start():
+        return response
+    return response[start.start():end + len(root_tag) + 3]
+
+
+def escape_ampersands(response, root_tag):
+    """Escapes "&" characters that do not start an entity."""
+    return pattern_ampersand.sub('&amp;', response)
+
+
+def balance_tags(response, root_tag):
+    """Closes an inline tag that was left open and removes a closing tag without opening tag."""
+    stack = []
+    for match in pattern_tag.finditer(response):
+        closing, name, self_closing = match.groups()
+        if self_closing:
+            continue
+        if not closing:
+            stack.append(name)
+        elif stack and stack[-1] == name:
+            stack.pop()
+        elif name in stack:
+            # The tags opened after <name> were never closed: close them here
+            unclosed = stack[stack.index(name) + 1:]
+            closing_tags = ''.join(f'</{tag}>' for tag in reversed(unclosed))
+            return response[:match.start()] + closing_tags + response[match.start():]
+        else:
+            # Closing tag without opening tag: remove it
+            return response[:match.start()] + response[match.end():]
+    return response + ''.join(f'</{tag}>' for tag in reversed(stack))
+
+
+# Fixes in the order in which they are applied
+FIXES = [
+    ('code_fence', strip_code_fence),
+    ('chatter', strip_chatter),
+    ('ampersand', escape_ampersands),
+    ('unbalanced_tag', balance_tags),
+]
+
+
+def normalize_text(text):
+    return ' '.join(html.unescape(text).split())
+
+
+def text_matches(element, candidate, response_text):
+    """
+    Checks that the repaired element holds the complete text of the repaired response and that
+    this text is part of the response text, i.e. that only wrapping around the XML was removed.
+    """
+    element_text = normalize_text(''.join(element.itertext()))
+    return (element_text == normalize_text(pattern_markup.sub('', candidate))
+            and element_text in normalize_text(response_text))
+
+
+def repair_response(response, root_tag):
+    """
+    Applies the fixes one after another until the response can be parsed.
+
+    Args:
+    response (str): The XML response of the AI model.
+    root_tag (str): Tag of the expected root element, e.g. 'p' or 'article'.
+
+    Returns:
+    tuple: (element, fixes) with the parsed element and the names of the applied fixes,
+    or (None, None) if the response could not be repaired.
+    """
+    response_text = pattern_markup.sub('', response)
+    candidate, applied = response, []
+    for name, fix in FIXES:
+        repaired = fix(candidate, root_tag)
+        if repaired == candidate:
+            continue
+        candidate = repaired
+        applied.append(name)
+        try:
+            element = ET.fromstring(candidate)
+        except ET.ParseError:
+            continue
+        if element.tag == root_tag and text_matches(element, candidate, response_text):
+            return element, '+'.join(applied)
+    return None, None
+
+
+def parse_response(response, root_tag):
+    """
+    Parses the XML response of the AI model and repairs it locally if necessary.
+
+    Returns:
+    tuple: (element, fixes), fixes being None if no repair was needed.
+
+    Raises:
+    ET.ParseError: If the response can neither be parsed nor repaired.
+    """
+    try:
+        return ET.fromstring(response), None
+    except ET.ParseError as error:
+        element, fixes = repair_response(response, root_tag)
+        if element is None:
+            raise error
+        return element, fixes
@@ -0,0 +1,291 @@
+'''Sendet nur die Einheiten (Absätze, Artikel oder Textabschnitte) erneut an das LLM, deren letzter Eintrag
+in der _process.log-Datei fehlgeschlagen ist, und ersetzt deren Ergebnis direkt in der vorhandenen
+_out.xml- bzw. _out.md-Datei. Wird von main.process_files() im Reparaturmodus aufgerufen.'''
+
+import os
+import re
+import json
+import logging
+from collections import Counter
+import xml.etree.ElementTree as ET
+from main import map_unordered, max_words_per_request, served_by, deadline_reached
+from log_store import iter_log_records
+
+# Responses that consist of an exception message returned by generate_content_with_retries()
+EXCEPTION_PATTERN = re.compile(
+    r"^\s*(Error code: \d+|\d{3} [A-Z][\w ]*:|Request timed out|Connection error|"
+    r"[A-Za-z.]*(Error|Exception)\b|'[\w-]+'$)"
+)
+MAX_EXCEPTION_LENGTH = 1000  # Longer responses are never treated as exception messages
+WRITE_EVERY = 20  # Number of repaired units after which the output file is written
+
+
+def load_latest_entries(log_file, mode):
+    """
+    Reads the process log and returns the latest entry of every unit.
+
+    Args:
+    log_file (str): Path to the _process.log file.
+    mode (str): Processing mode 'text', 'xml_paragraph' or 'xml_article'.
+
+    Returns:
+    list: The latest log entry per unit, in order of their first appearance in the log.
+    """
+    latest = {}
+    for entry in iter_log_records(log_file):
+        if mode == 'xml_article':
+            key = entry.get('id')
+        else:
+            key = (entry.get('id', entry.get('chunk_id')), entry.get('content'))
+        latest[key] = entry
+    return list(latest.values())
+
+
+def is_failed(entry):
+    """A unit failed if its status is 'error' or its response is an exception message."""
+    if entry.get('status') == 'error':
+        return True
+    response = entry.get('response') or ''
+    return len(response) < MAX_EXCEPTION_LENGTH and bool(EXCEPTION_PATTERN.match(response))
+
+
+def select_failed_units(log_file, mode):
+    failed = [entry for entry in load_latest_entries(log_file, mode) if is_failed(entry)]
+    print(f"{len(failed)} failed units found in {log_file}")
+    return failed
+
+
+def is_edited(entry):
+    """A successful entry whose response differs from its content; short paragraphs are not sent."""
+    return (entry.get('status') == 'success' and entry.get('response') != "N/A"
+            and normalize_text(entry.get('response_text') or '') != normalize_text(entry.get('content_text') or ''))
+
+
+def find_output_file(output_file, extension):
+    """Returns the existing output file, with or without extension."""
+    for candidate in (output_file, output_file + extension):
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f"No output file found for {output_file}")
+
+
+def normalize_text(text):
+    return ' '.join(text.split())
+
+
+def load_input_hashes(input_file):
+    """Returns the input hash (see incremental.py) of every article of the original input file by id."""
+    if not input_file or not os.path.exists(input_file):
+        return {}
+    from incremental import input_hash
+    root = ET.parse(input_file, parser=ET.XMLParser(encoding="utf-8")).getroot()
+    return {article.get('id'): input_hash(article) for article in root.iter('article') if article.get('id')}
+
+
+def rerun_xml_paragraphs(PROVIDER, model, units, output_file, checkpoint_file, input_file, log_file, concurrency):
+    from process_xml_paragraph import (process_paragraph, remove_redundant_p_tags, get_text, tree_lock,
+                                       load_checkpoint, update_checkpoint)
+    from incremental import output_hash
+
+    tree = ET.parse(output_file, parser=ET.XMLParser(encoding="utf-8"))
+    root = tree.getroot()
+    articles = {article.get('id'): article for article in root.iter('article')}
+
+    # Paragraphs logged as successful may still hold their original content, if an earlier run did not save
+    # the article after another of its paragraphs failed; they are sent again with the failed ones
+    unsaved = [entry for entry in load_latest_entries(log_file, 'xml_paragraph')
+               if is_edited(entry) and not is_failed(entry) and entry.get('id') in articles]
+
+    # Find the paragraphs that still hold the original content of each unit. Identical paragraphs of an
+    # article share one log entry, so every paragraph with that content is repaired, each of them once.
+    targets = []
+    taken = set()
+    incomplete = set()  # Articles with a failed paragraph that cannot be repaired
+    resent = 0  # Successful paragraphs without their response in the output
+    for entry, failed in [(entry, True) for entry in units] + [(entry, False) for entry in unsaved]:
+        article = articles.get(entry['id'])
+        expected = normalize_text(entry['content_text'])
+        found = False
+        for paragraph in (article.iter('p') if article is not None else ()):
+            if id(paragraph) in taken or normalize_text(get_text(paragraph)) != expected:
+                continue
+            # A <p> wrapped around the paragraph by a failed run is repaired as a whole
+            taken.update(id(p) for p in paragraph.iter('p'))
+            targets.append((entry['id'], paragraph))
+            resent += not failed
+            found = True
+        if found or not failed:
+            continue  # The response of a successful paragraph that is not found is in the output
+        print(f"Paragraph of article {entry['id']} not found in {output_file}, skipped.")
+        incomplete.add(entry['id'])
+    if resent:
+        print(f"{resent} successful paragraphs whose response is missing in {output_file} are sent again")
+
+    processed_articles = load_checkpoint(checkpoint_file)
+    input_hashes = load_input_hashes(input_file)
+    remaining = Counter(article_id for article_id, _ in targets)
+
+    def write_output():
+        with tree_lock:
+            remove_redundant_p_tags(root)
+            tree.write(output_file, encoding='utf-8', xml_declaration=True)
+
+    def rerun(target):
+        return process_paragraph(PROVIDER, model, target[1]), served_by()
+
+    repaired = 0
+    count = 0
+    for count, (index, (result, provider)) in enumerate(map_unordered(rerun, targets, concurrency, deadline_reached),
+                                                          start=1):
+        modified, log_text, content_text, response_text, content, response, repair = result
+        article_id = targets[index][0]
+        repaired += modified
+        log_entry = {
+            "id": article_id,
+            "status": "success" if modified else "error",
+            "message": log_text,
+            "content_text": content_text,
+            "response_text": response_text,
+            "content": content,
+            "response": response
+        }
+        if repair:
+            log_entry["repair"] = repair
+        if provider and response != "N/A":
+            log_entry["provider"] = provider
+        logging.info(json.dumps(log_entry, ensure_ascii=False))
+        if not modified:
+            incomplete.add(article_id)
+        remaining[article_id] -= 1
+        if remaining[article_id] == 0 and article_id not in incomplete:
+            # All paragraphs of the article hold their response: the next normal run skips or copies it
+            write_output()
+            hashes = {'output': output_hash(articles[article_id])}
+            if article_id in input_hashes:
+                hashes['input'] = input_hashes[article_id]
+            update_checkpoint(checkpoint_file, processed_articles, article_id, hashes)
+        elif count % WRITE_EVERY == 0:
+            write_output()
+    # Also written when stopped by the run deadline: the paragraphs repaired so far
+    write_output()
+    return repaired, len(targets)
+
+
+def rerun_xml_articles(PROVIDER, model, units, output_file, checkpoint_file, limits, concurrency):
+    from process_xml_article import (process_article, remove_redundant_article_tags, load_checkpoint,
+                                     get_prompt, tree_lock)
+
+    tree = ET.parse(output_file, parser=ET.XMLParser(encoding="utf-8"))
+    root = tree.getroot()
+    articles = {article.get('id'): article for article in root.iter('article')}
+    processed_articles = load_checkpoint(checkpoint_file)
+    max_words = max_words_per_request(limits, get_prompt())
+
+    repaired = 0
+    for entry in units:
+        if deadline_reached():
+            print("Run deadline reached, the remaining articles are repaired on the next run.")
+            break
+        article = articles.get(entry['id'])
+        if article is None:
+            print(f"Article {entry['id']} not found in {output_file}, skipped.")
+            continue
+        processed_articles.pop(entry['id'], None)
+        repaired += process_article(PROVIDER, model, article, processed_articles, checkpoint_file, max_words,
+                                    concurrency)
+        with tree_lock:
+            remove_redundant_article_tags(root)
+            tree.write(output_file, encoding='utf-8', xml_declaration=True)
+    return repaired, len(units)
+
+
+def locate_chunks(text, entries):
+    """
+    Finds the sections of the output text in chunk order. Each chunk shows up in the output as its response
+    or its error message; searching from the end of the previous chunk assigns identical texts (e.g. the same
+    error message of several chunks) to their own positions.
+
+    Args:
+    text (str): The content of the _out.md file.
+    entries (list): The latest log entries of all chunks.
+
+    Returns:
+    dict: (start, end) in text per chunk_id; chunks that are not found are missing.
+    """
+    latest = {entry['chunk_id']: entry for entry in entries if entry.get('chunk_id')}
+    spans = {}
+    position = 0
+    for chunk_id in sorted(latest):
+        entry = latest[chunk_id]
+        written = entry.get('response') or entry.get('message')
+        start = text.find(written, position) if written else -1
+        if start < 0:
+            continue
+        spans[chunk_id] = (start, start + len(written))
+        position = start + len(written)
+    return spans
+
+
+def rerun_text_chunks(PROVIDER, model, units, output_file, log_file, concurrency):
+    from process_txt import process_chunk
+
+    with open(output_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    spans = locate_chunks(text, load_latest_entries(log_file, 'text'))
+
+    def rerun(entry):
+        return process_chunk(PROVIDER, model, entry['chunk_id'] - 1, entry['content'], len(units),
+                             entry['chunk_size'])
+
+    replacements = []
+    for index, (response, log_entry) in map_unordered(rerun, units, concurrency, deadline_reached):
+        logging.info(json.dumps(log_entry, ensure_ascii=False))
+        chunk_id = units[index]['chunk_id']
+        if log_entry['status'] != 'success':
+            continue
+        if chunk_id in spans:
+            replacements.append((spans[chunk_id], response))
+        else:
+            print(f"Section {chunk_id} not found in {output_file}, skipped.")
+
+    # Replaced from the end, so the positions of the preceding sections stay valid
+    for (start, end), response in sorted(replacements, reverse=True):
+        text = text[:start] + response + text[end:]
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return len(replacements), len(units)
+
+
+def rerun_failed_units(PROVIDER, model, mode, log_file, output_file, checkpoint_file, limits=None, concurrency=1,
+                       input_file=None):
+    """
+    Re-sends only the failed units of a previous run and patches the results into its output file. In
+    xml_paragraph mode the successful paragraphs whose response is missing in the output are sent again too.
+
+    Args:
+    mode (str): Processing mode of the previous run: 'text', 'xml_paragraph' or 'xml_article'.
+    log_file (str): Path to the _process.log file of the previous run.
+    output_file (str): Path to the output file of the previous run (with or without extension).
+    checkpoint_file (str): Path to the checkpoint file (used in xml modes).
+    input_file (str): The original input file; its article hashes are stored with repaired articles
+        (xml_paragraph mode), so the next normal run does not send them again.
+    """
+    units = select_failed_units(log_file, mode)
+    # In xml_paragraph mode successful paragraphs that are missing in the output are repaired as well
+    if not units and mode != 'xml_paragraph':
+        return
+    if mode == 'text':
+        output_file = find_output_file(output_file, '.md')
+        repaired, total = rerun_text_chunks(PROVIDER, model, units, output_file, log_file, concurrency)
+    elif mode == 'xml_paragraph':
+        output_file = find_output_file(output_file, '.xml')
+        repaired, total = rerun_xml_paragraphs(PROVIDER, model, units, output_file, checkpoint_file, input_file,
+                                               log_file, concurrency)
+    elif mode == 'xml_article':
+        output_file = find_output_file(output_file, '.xml')
+        repaired, total = rerun_xml_articles(PROVIDER, model, units, output_file, checkpoint_file, limits,
+                                             concurrency)
+    else:
+        print("No valid processing mode available. Select available processing mode")
+        return
+    print(f"{repaired} of {total} failed units repaired in {output_file}")
@@ -0,0 +1,79 @@
+'''Reihenfolge der Einheiten bei paralleler Verarbeitung. Werden Artikel in Dokumentreihenfolge verteilt, kann ein
+sehr langer Artikel am Ende den Lauf weit über das Ende aller anderen hinaus verlängern. map_longest_first()
+verteilt die Einheiten deshalb nach absteigendem Aufwand (Wortzahl) und gibt am Ende aus, wie lange der Lauf
+gedauert hat und wie lange er mit den gemessenen Dauern in Dokumentreihenfolge gedauert hätte.
+Die Einheiten werden auf Arbeitskopien bearbeitet und mit adopt() in den Baum übernommen, sodass die
+Ausgabedatei immer nur vollständig bearbeitete Artikel an ihrer ursprünglichen Stelle enthält.'''
+
+import time
+import heapq
+from main import map_unordered
+
+
+def longest_first(costs):
+    """Returns the indices of the units by descending cost; equal costs keep their document order."""
+    return sorted(range(len(costs)), key=lambda index: -costs[index])
+
+
+def makespan(durations, order, concurrency):
+    """
+    Simulates the dispatch of the units in `order` to `concurrency` workers, each unit going to the first
+    free worker.
+
+    Returns:
+    float: The time at which the last unit is finished.
+    """
+    workers = [0.0] * max(1, concurrency)
+    for index in order:
+        heapq.heappush(workers, heapq.heappop(workers) + durations[index])
+    return max(workers)
+
+
+def map_longest_first(func, items, costs, concurrency=1, stop=None):
+    """
+    Applies func to every item like map_unordered(), dispatching the items with the highest cost first.
+
+    Args:
+    func: Function called with a single item.
+    items (list): Items to process.
+    costs (list): Estimated cost per item, e.g. its word count.
+    concurrency (int): Maximum number of calls running at the same time.
+    stop: Function without arguments; once it returns True no further items are started (see map_unordered).
+
+    Yields:
+    tuple: (index, result) pairs in order of completion, index being the position of the item in items.
+    """
+    order = longest_first(costs)
+    durations = [0.0] * len(items)
+
+    def timed(index):
+        start = time.monotonic()
+        try:
+            return func(items[index])
+        finally:
+            durations[index] = time.monotonic() - start
+
+    start = time.monotonic()
+    finished = 0
+    for position, result in map_unordered(timed, order, concurrency, stop):
+        finished += 1
+        yield order[position], result
+    if len(items) > 1 and concurrency > 1 and finished == len(items):
+        report_makespan(time.monotonic() - start, durations, order, concurrency)
+
+
+def report_makespan(elapsed, durations, order, concurrency):
+    document_order = makespan(durations, range(len(durations)), concurrency)
+    print(f"Makespan: {elapsed:.1f} s longest first with {concurrency} workers; "
+          f"document order would have taken {document_order:.1f} s "
+          f"(simulated from the measured durations: longest first {makespan(durations, order, concurrency):.1f} s)")
+
+
+def adopt(target, source):
+    """Replaces the content and attributes of `target` by those of its processed working copy `source`."""
+    tail = target.tail
+    target.clear()
+    target.attrib.update(source.attrib)
+    target.text = source.text
+    target.extend(list(source))
+    target.tail = tail
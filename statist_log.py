@@ -1,31 +1,31 @@
 '''Wertet die .log-Datei statistisch aus und schreibt das Ergebnis in eine .txt-Datei.'''
 
 import pandas as pd
+import numpy as np
 import json
+import hashlib
 import os
 import sys
 from datetime import datetime
+from log_store import open_store, expand_record, iter_log_records
 
 INPUT_FILENAME = 'CalwerFULL_process.log'
 DIRECTORY_PATH = 'C:/Users/Fried/documents/LectorAssistant/bearbeitet_txt/'
 INPUT_FILE = os.path.join(DIRECTORY_PATH, INPUT_FILENAME)
 
+# Streaming statistics: read only the lines appended since the last run, in chunks of bounded size
+STREAMING = True
+STATE_SUFFIX = '.stats.json'  # Running aggregates and read offset, saved next to the log file
+STATE_VERSION = 3  # States of other versions are recomputed
+CHUNK_BYTES = 16 * 1024 * 1024  # Maximum number of bytes read at once
+
+EXCLUDED_STATUS = ['success']
+EXCLUDED_MESSAGES = ['Paragraph too short, skipped processing.']
+
 
 def load_data(file_path):
-    """Load data from log file and return a list of parsed entries."""
-    data = []
-    with open(file_path, 'r', encoding='utf-8') as file:
-        for line in file:
-            line = line.strip()
-            if line:
-                try:
-                    timestamp, json_text = line.split(' - ', 1)
-                    entry = json.loads(json_text)
-                    entry['timestamp'] = timestamp
-                    data.append(entry)
-                except (ValueError, json.JSONDecodeError) as e:
-                    print(f"Error processing line: {line}\n{e}")
-    return data
+    """Load data from log file and return a list of parsed entries (compact logs are expanded)."""
+    return list(iter_log_records(file_path))
 
 
 def extract_message_short(message):
@@ -34,32 +34,151 @@ def extract_message_short(message):
     return message[:colon_indices[1] + 1] if len(colon_indices) >= 2 else message
 
 
+def unit_digest(unit_id, content):
+    """Returns an 8-byte hash of the id and the full content that identifies a unit."""
+    return hashlib.blake2b(f"{unit_id}\x1f{content}".encode('utf-8'), digest_size=8).digest()
+
+
+def unit_label(unit_id, content):
+    """Readable name of a unit for the report."""
+    return f"{unit_id}|{str(content)[:50]}"
+
+
 def create_dataframe(data):
     """Create and preprocess DataFrame from loaded data."""
     df = pd.DataFrame(data)
     df['message_short'] = df['message'].apply(extract_message_short)
     df['message_short'] = df['message_short'].str.encode('ascii', errors='ignore').str.decode('ascii')
-    df['id-content'] = df['id'] + '|' + df['content'].str[:50]
-    df['id-content-message'] = df['id-content'] + ' | ' + df['message_short']
+
+    # Fixed-width unit key instead of the string id + content[:50]
+    df['unit'] = np.frombuffer(
+        b''.join(unit_digest(unit_id, content) for unit_id, content in zip(df['id'], df['content'])),
+        dtype=np.int64)
 
     # Convert timestamp to datetime
     df['timestamp'] = pd.to_datetime(df['timestamp'])
 
-    # Sort the dataframe by 'id-content' and 'timestamp'
-    df = df.sort_values(['id-content', 'timestamp'])
-
-    # Create the 'latest' column
-    df['latest'] = df.groupby('id-content')['timestamp'].transform('max') == df['timestamp']
+    # The last entry per unit after a stable sort is the latest; with equal timestamps the later line wins
+    df = df.sort_values(['unit', 'timestamp'], kind='stable')
+    df['latest'] = ~df.duplicated('unit', keep='last')
     return df
 
 
 def filter_dataframe(df, excluded_status, excluded_messages):
     """Filter DataFrame based on excluded status, messages, and latest flag."""
-    return df[
+    df_filtered = df[
         (~df['status'].isin(excluded_status)) &
         (~df['message'].isin(excluded_messages)) &
         (df['latest'] == True)
-    ]
+    ].copy()
+    # Readable names only for the reported entries
+    df_filtered['id-content'] = [unit_label(unit_id, content)
+                                 for unit_id, content in zip(df_filtered['id'], df_filtered['content'])]
+    df_filtered['id-content-message'] = df_filtered['id-content'] + ' | ' + df_filtered['message_short']
+    return df_filtered.sort_values('id-content', kind='stable')
+
+
+def new_state(excluded_status=EXCLUDED_STATUS, excluded_messages=EXCLUDED_MESSAGES):
+    return {'version': STATE_VERSION, 'excluded': [list(excluded_status), list(excluded_messages)],
+            'offset': 0, 'lines': 0, 'statuses': {}, 'units': {}}
+
+
+def load_state(state_file, excluded_status=EXCLUDED_STATUS, excluded_messages=EXCLUDED_MESSAGES):
+    """Loads the saved state; a state of another version or with other exclusions is recomputed."""
+    if os.path.exists(state_file):
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if (state.get('version') == STATE_VERSION
+                and state.get('excluded') == [list(excluded_status), list(excluded_messages)]):
+            return state
+    return new_state(excluded_status, excluded_messages)
+
+
+def save_state(state_file, state):
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+
+
+def update_stats(file_path, state_file=None, excluded_status=EXCLUDED_STATUS, excluded_messages=EXCLUDED_MESSAGES):
+    """
+    Reads the lines appended to the log since the last call and updates the aggregates. Only units whose latest
+    entry is reported (status and message not excluded) are kept; a unit is dropped as soon as a later entry
+    is excluded, e.g. a successful repair. The process log is written in chronological order, so the latest
+    line of a unit is its latest entry.
+
+    Returns:
+    dict: The state with 'offset', 'lines', 'statuses' (entries per status) and 'units'
+        (unit hash -> [timestamp, status, message, id, label]).
+    """
+    state_file = state_file or file_path + STATE_SUFFIX
+    state = load_state(state_file, excluded_status, excluded_messages)
+    if os.path.getsize(file_path) < state['offset']:
+        print("Log file is shorter than at the last run, statistics are recomputed.")
+        state = new_state(excluded_status, excluded_messages)
+
+    units = state['units']
+    statuses = state['statuses']
+    store = open_store(file_path)
+    with open(file_path, 'rb') as file:
+        file.seek(state['offset'])
+        complete = True
+        while complete:
+            lines = file.readlines(CHUNK_BYTES)
+            if not lines:
+                break
+            for raw_line in lines:
+                if not raw_line.endswith(b'\n'):
+                    complete = False  # The last line is still being written
+                    break
+                state['offset'] += len(raw_line)
+                state['lines'] += 1
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if not line:
+                    continue
+                try:
+                    timestamp, json_text = line.split(' - ', 1)
+                    entry = expand_record(json.loads(json_text), store)
+                except (ValueError, json.JSONDecodeError) as e:
+                    print(f"Error processing line: {line[:200]}\n{e}")
+                    continue
+                status = entry.get('status')
+                message = entry.get('message', '')
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                unit_id = entry.get('id', entry.get('chunk_id'))
+                content = entry.get('content', '')
+                key = unit_digest(unit_id, content).hex()
+                if key in units and units[key][0] > timestamp:
+                    continue
+                if status in excluded_status or message in excluded_messages:
+                    units.pop(key, None)
+                else:
+                    units[key] = [timestamp, status, message, str(unit_id), unit_label(unit_id, content)]
+    if store is not None:
+        store.close()
+    save_state(state_file, state)
+    return state
+
+
+def print_stream_report(state):
+    """Prints the same report as main() from the running aggregates."""
+    filtered = sorted(state['units'].values(), key=lambda unit: unit[4])
+    message_counts = {}
+    for unit in filtered:
+        message_short = extract_message_short(unit[2]).encode('ascii', errors='ignore').decode('ascii')
+        message_counts[message_short] = message_counts.get(message_short, 0) + 1
+
+    print(f"\nLines read: {state['lines']}, entries per status: "
+          + ", ".join(f"{status}: {count}" for status, count in sorted(state['statuses'].items())))
+    print(f"\nNumber of unique messages in 'message_short': {len(message_counts)}")
+    print("\nUnique messages and their counts:")
+    for message, count in sorted(message_counts.items(), key=lambda item: -item[1]):
+        print(f"'{message}': {count}")
+
+    print(f"\nNumber of unique IDs in 'ID': {len({unit[3] for unit in filtered})}")
+    print("\nDatensätze von df_filtered['id-content-message']:")
+    for unit in filtered:
+        message_short = extract_message_short(unit[2]).encode('ascii', errors='ignore').decode('ascii')
+        print(f"{unit[4]} | {message_short}")
 
 
 def main():
@@ -92,11 +211,16 @@ def main():
         sys.stdout = MultiWriter(sys.stdout, f)  # Redirect stdout to both console and file
 
         try:
+            excluded_status = EXCLUDED_STATUS
+            excluded_messages = EXCLUDED_MESSAGES
+            if STREAMING:
+                print_stream_report(update_stats(INPUT_FILE, excluded_status=excluded_status,
+                                                 excluded_messages=excluded_messages))
+                return
+
             data = load_data(INPUT_FILE)
             df = create_dataframe(data)
 
-            excluded_status = ['success']
-            excluded_messages = ['Paragraph too short, skipped processing.']
             df_filtered = filter_dataframe(df, excluded_status, excluded_messages)
 
             # Determine the unique messages in 'message_short' in df_filtered
@@ -4,6 +4,7 @@ im Logos xml-Format.'''
 # Import der notwendigen Bibliothek
 from lxml import etree
 import os
+from profiling import configure_profiling, profile_stage
 
 # Input filename
 INPUT_FILENAME = 'CalwerFULL_241009_out_TransBiblEnDe_AbsInXml_B_out.xml'
@@ -15,24 +16,45 @@ OUTPUT_TXT_PATH = 'C:/Users/Fried/documents/LectorAssistant/logos_tags/bearbeite
 INPUT_FILE = os.path.join(DIRECTORY_PATH, INPUT_FILENAME)
 OUTPUT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_Ueb.xml')
 
+# Profile the stages with cProfile / tracemalloc; reports are written next to OUTPUT_FILE
+PROFILE = False
+PROFILE_MEMORY = False
 
-# XML-Datei einlesen
-tree = etree.parse(INPUT_FILE)
-root = tree.getroot()
 
-root_string = etree.tostring(root, encoding='unicode')
+def convert_headlines(root):
+    """
+    Ersetzt die Überschriften {{Überschrift}} im Text durch <p field="heading" class="head3">-Elemente.
 
-root_string_headline_o = root_string.replace('{{', '<p field="heading" class="head3">')
-root_string_headline_oc = root_string_headline_o.replace('}}', '</p>')
+    Returns:
+    Das neue Wurzelelement.
+    """
+    root_string = etree.tostring(root, encoding='unicode')
 
+    root_string_headline_o = root_string.replace('{{', '<p field="heading" class="head3">')
+    root_string_headline_oc = root_string_headline_o.replace('}}', '</p>')
 
-root = etree.fromstring(root_string_headline_oc)
+    return etree.fromstring(root_string_headline_oc)
 
-# Erstellen Sie ein neues ElementTree-Objekt mit dem modifizierten root
-new_tree = etree.ElementTree(root)
 
-# Speichern Sie das neue ElementTree-Objekt als XML-Datei
-new_tree.write(OUTPUT_FILE, encoding='utf-8', xml_declaration=True, pretty_print=True)
+def main():
+    configure_profiling(OUTPUT_FILE, PROFILE, PROFILE_MEMORY)
 
-print(f"XML file has been processed successfully: {OUTPUT_FILE}")
-print("Processing completed successfully.")
\ No newline at end of file
+    # XML-Datei einlesen
+    with profile_stage('parse_input'):
+        tree = etree.parse(INPUT_FILE)
+    with profile_stage('convert_headlines'):
+        root = convert_headlines(tree.getroot())
+
+    # Erstellen Sie ein neues ElementTree-Objekt mit dem modifizierten root
+    new_tree = etree.ElementTree(root)
+
+    # Speichern Sie das neue ElementTree-Objekt als XML-Datei
+    with profile_stage('write_output'):
+        new_tree.write(OUTPUT_FILE, encoding='utf-8', xml_declaration=True, pretty_print=True)
+
+    print(f"XML file has been processed successfully: {OUTPUT_FILE}")
+    print("Processing completed successfully.")
+
+
+if __name__ == "__main__":
+    main()
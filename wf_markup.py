@@ -0,0 +1,125 @@
+'''Liest die Markierungen einer manuell nachbearbeiteten dateiname_WF1234.md-Datei in einem einzigen Durchlauf
+und gibt ein schlankes Dokumentmodell zurück, aus dem create_logos_xml.py und create_obsidian_md.py ihre
+Ausgabe erzeugen.
+
+Markierungen:
+    { }       Überschriften für Inhaltsverzeichnis (Artikel)
+    {{ }}     Absatzüberschriften
+    [[ ]]     Absätze
+    {{{ }}}   Verweise auf Bibelstellen'''
+
+import re
+from collections import namedtuple
+
+# Document model: parse() returns a flat list of these nodes in the order of the text
+Text = namedtuple('Text', 'text')  # Text outside of any markup
+Article = namedtuple('Article', 'title')  # {Titel}
+Headline = namedtuple('Headline', 'text')  # {{Überschrift}}
+Paragraph = namedtuple('Paragraph', 'segments')  # [[Absatz]], segments are str or Bible
+Bible = namedtuple('Bible', 'ref')  # {{{Röm. 1, 1-17}}}
+
+# An article with the headlines and paragraphs that follow its title
+ArticleBlock = namedtuple('ArticleBlock', 'title blocks')
+
+# One alternation, so the text is scanned only once; longer braces are tried first
+pattern_markup = re.compile(
+    r'\{\{\{([^{}]+)\}\}\}'
+    r'|\{\{([^{}]+)\}\}'
+    r'|\{([^{}]+)\}'
+    r'|\[\[([^\[\]]+)\]\]'
+)
+pattern_bible = re.compile(r'\{\{\{([^{}]+)\}\}\}')
+
+BLOCK_SIZE = 2 ** 20  # Characters read at a time by iter_nodes_from_file()
+
+
+def parse_segments(text):
+    """Splits the text of a paragraph into strings and Bible references."""
+    segments, pos = [], 0
+    for match in pattern_bible.finditer(text):
+        if match.start() > pos:
+            segments.append(text[pos:match.start()])
+        segments.append(Bible(match.group(1)))
+        pos = match.end()
+    if pos < len(text):
+        segments.append(text[pos:])
+    return segments
+
+
+def markup_node(match):
+    """Returns the node of a match of pattern_markup."""
+    bible, headline, title, paragraph = match.groups()
+    if bible is not None:
+        return Bible(bible)
+    elif headline is not None:
+        return Headline(headline)
+    elif title is not None:
+        return Article(title)
+    return Paragraph(parse_segments(paragraph))
+
+
+def iter_nodes(text):
+    """Yields the nodes of the document model in the order of the text."""
+    pos = 0
+    for match in pattern_markup.finditer(text):
+        if match.start() > pos:
+            yield Text(text[pos:match.start()])
+        yield markup_node(match)
+        pos = match.end()
+    if pos < len(text):
+        yield Text(text[pos:])
+
+
+def last_run_start(text, char):
+    """Returns the start of the last run of `char` in text, or len(text) if text does not contain it."""
+    index = text.rfind(char)
+    if index < 0:
+        return len(text)
+    while index > 0 and text[index - 1] == char:
+        index -= 1
+    return index
+
+
+def iter_nodes_from_file(file, block_size=BLOCK_SIZE):
+    """
+    Yields the same nodes as iter_nodes(file.read()), reading the file in blocks of block_size characters.
+
+    Markup is only taken from a block before the last run of '[' and of '{': the content of each markup stops
+    at the next bracket or brace, so every match before them is complete. The rest is kept for the next block.
+    """
+    buffer = ''
+    for block in iter(lambda: file.read(block_size), ''):
+        buffer += block
+        safe = min(last_run_start(buffer, '['), last_run_start(buffer, '{'))
+        pos = 0
+        for match in pattern_markup.finditer(buffer):
+            if match.start() >= safe:
+                break
+            if match.start() > pos:
+                yield Text(buffer[pos:match.start()])
+            yield markup_node(match)
+            pos = match.end()
+        buffer = buffer[pos:]
+    yield from iter_nodes(buffer)
+
+
+def parse(text):
+    """Parses the WF1234 markup into a list of nodes."""
+    return list(iter_nodes(text))
+
+
+def iter_articles(nodes):
+    """
+    Groups the nodes into articles. Headlines and paragraphs before the first article are ignored,
+    text outside of markup and Bible references outside of paragraphs are dropped.
+    """
+    current = None
+    for node in nodes:
+        if isinstance(node, Article):
+            if current is not None:
+                yield current
+            current = ArticleBlock(node.title, [])
+        elif current is not None and isinstance(node, (Headline, Paragraph)):
+            current.blocks.append(node)
+    if current is not None:
+        yield current
@@ -0,0 +1,171 @@
+'''Wortweiser Textvergleich für check.py. Der Vergleich verankert beide Texte an Wörtern, die in beiden Texten
+genau einmal vorkommen (Patience-Diff), und vergleicht nur die kurzen Abschnitte dazwischen mit
+difflib.SequenceMatcher. Er liefert die Zeichenbereiche, die im originalen Text entfernt bzw. im ausgegebenen
+Text ergänzt wurden.
+DiffCache hält die zuletzt berechneten Vergleiche vor und berechnet benachbarte Datensätze im Hintergrund.'''
+
+import re
+import queue
+import bisect
+import difflib
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = 64  # Number of diffs kept in the cache
+MAX_FALLBACK_SIZE = 250000  # Ranges without unique words up to this product of lengths use SequenceMatcher
+
+# Words and single punctuation characters; whitespace is not compared
+pattern_token = re.compile(r'\w+|[^\w\s]')
+
+
+def tokenize(text):
+    """Returns the tokens of the text and their (start, end) character ranges."""
+    tokens, ranges = [], []
+    for match in pattern_token.finditer(text):
+        tokens.append(match.group())
+        ranges.append(match.span())
+    return tokens, ranges
+
+
+def unique_anchors(a, b, a0, a1, b0, b1):
+    """
+    Returns the pairs of positions of tokens that occur exactly once in a[a0:a1] and in b[b0:b1],
+    reduced to the longest sequence that is ascending in both (patience diff).
+    """
+    positions_a, positions_b = {}, {}
+    for i in range(a0, a1):
+        positions_a[a[i]] = None if a[i] in positions_a else i
+    for j in range(b0, b1):
+        positions_b[b[j]] = None if b[j] in positions_b else j
+    candidates = [(i, positions_b[token]) for token, i in positions_a.items()
+                  if i is not None and positions_b.get(token) is not None]
+    candidates.sort()
+
+    # Longest increasing subsequence of the positions in b
+    tails, tail_indices, previous = [], [], [None] * len(candidates)
+    for index, (_, j) in enumerate(candidates):
+        k = bisect.bisect_left(tails, j)
+        if k == len(tails):
+            tails.append(j)
+            tail_indices.append(index)
+        else:
+            tails[k] = j
+            tail_indices[k] = index
+        previous[index] = tail_indices[k - 1] if k else None
+    anchors, index = [], tail_indices[-1] if tail_indices else None
+    while index is not None:
+        anchors.append(candidates[index])
+        index = previous[index]
+    return anchors[::-1]
+
+
+def matching_pairs(a, b):
+    """Returns the pairs (i, j) of matching tokens a[i] == b[j] of a word diff."""
+    pairs = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a0, a1, b0, b1 = stack.pop()
+        # Common prefix and suffix
+        while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+            pairs.append((a0, b0))
+            a0, b0 = a0 + 1, b0 + 1
+        while a0 < a1 and b0 < b1 and a[a1 - 1] == b[b1 - 1]:
+            a1, b1 = a1 - 1, b1 - 1
+            pairs.append((a1, b1))
+        if a0 == a1 or b0 == b1:
+            continue
+        anchors = unique_anchors(a, b, a0, a1, b0, b1)
+        if anchors:
+            # Compare the ranges between the anchors separately
+            for i, j in anchors:
+                pairs.append((i, j))
+                stack.append((a0, i, b0, j))
+                a0, b0 = i + 1, j + 1
+            stack.append((a0, a1, b0, b1))
+        elif (a1 - a0) * (b1 - b0) <= MAX_FALLBACK_SIZE:
+            matcher = difflib.SequenceMatcher(None, a[a0:a1], b[b0:b1], autojunk=False)
+            for i, j, size in matcher.get_matching_blocks():
+                pairs.extend((a0 + i + k, b0 + j + k) for k in range(size))
+    return pairs
+
+
+def changed_ranges(ranges, matched):
+    """Joins the character ranges of consecutive unmatched tokens."""
+    spans = []
+    for index, (start, end) in enumerate(ranges):
+        if index in matched:
+            continue
+        if spans and spans[-1][2] == index - 1:
+            spans[-1] = (spans[-1][0], end, index)
+        else:
+            spans.append((start, end, index))
+    return [(start, end) for start, end, _ in spans]
+
+
+def diff_spans(text1, text2):
+    """
+    Compares two texts word by word.
+
+    Returns:
+    tuple: (removed, added), lists of (start, end) character ranges in text1 that were removed
+    and in text2 that were added.
+    """
+    tokens1, ranges1 = tokenize(text1)
+    tokens2, ranges2 = tokenize(text2)
+    pairs = matching_pairs(tokens1, tokens2)
+    removed = changed_ranges(ranges1, {i for i, _ in pairs})
+    added = changed_ranges(ranges2, {j for _, j in pairs})
+    return removed, added
+
+
+class DiffCache:
+    """
+    LRU cache of diffs, keyed by record position. Every entry holds a digest of the compared texts, so a
+    position that holds another record after the log was rewritten is computed again. prefetch() computes
+    diffs on a background thread.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.tasks = queue.Queue()
+        threading.Thread(target=self.worker, daemon=True).start()
+
+    @staticmethod
+    def digest(text1, text2):
+        return hashlib.blake2b(f"{text1}\x1f{text2}".encode('utf-8', errors='replace'), digest_size=16).digest()
+
+    def lookup(self, key, digest):
+        with self.lock:
+            if key in self.cache and self.cache[key][0] == digest:
+                self.cache.move_to_end(key)
+                return self.cache[key][1]
+        return None
+
+    def store(self, key, digest, spans):
+        with self.lock:
+            self.cache[key] = (digest, spans)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+
+    def get(self, key, text1, text2):
+        """Returns the diff of the two texts, computing it if it is not cached."""
+        digest = self.digest(text1, text2)
+        spans = self.lookup(key, digest)
+        if spans is None:
+            spans = diff_spans(text1, text2)
+            self.store(key, digest, spans)
+        return spans
+
+    def prefetch(self, key, text1, text2):
+        """Schedules the diff of the two texts for computation on the background thread."""
+        if self.lookup(key, self.digest(text1, text2)) is None:
+            self.tasks.put((key, text1, text2))
+
+    def worker(self):
+        while True:
+            key, text1, text2 = self.tasks.get()
+            self.get(key, text1, text2)
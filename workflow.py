@@ -0,0 +1,230 @@
+'''Führt den XML-Workflow aus workflow.txt als Kette von Schritten aus:
+process_xml_paragraph -> absatz_in_xml -> process_xml_article -> ueberschrift_in_xml -> bibelstellen_en_de.
+Jedes Zwischenergebnis wird im CACHE_DIRECTORY unter einem Schlüssel abgelegt, der aus dem Hash der
+Eingabedatei, den Parametern des Schritts und dem Quelltext des Skripts gebildet wird. Bei einem erneuten Lauf
+werden nur die Schritte ausgeführt, deren Schlüssel sich geändert hat, und die Schritte danach; wird z.B. die
+Tabelle in bibelstellen_en_de.py korrigiert, läuft nur der letzte Schritt erneut, ohne LLM-Aufrufe.
+Bei den LLM-Schritten zählen Anbieter, Modell und Prompt, nicht der Quelltext, damit eine Änderung an der
+Ausgabe oder Protokollierung keinen neuen LLM-Durchlauf auslöst.
+
+Aufruf: python workflow.py          Führt den Workflow aus
+        python workflow.py status   Zeigt, welche Schritte zwischengespeichert sind'''
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import inspect
+import importlib
+from collections import namedtuple
+import xml.etree.ElementTree as ET
+from lxml import etree
+
+import main
+from profiling import configure_profiling, profile_stage
+
+# Input filename
+INPUT_FILENAME = 'CalwerFULL_241009.xml'
+
+# File paths
+DIRECTORY_PATH = 'C:/Users/Fried/documents/LectorAssistant/logos_tags/'
+OUTPUT_TXT_PATH = 'C:/Users/Fried/documents/LectorAssistant/logos_tags/bearbeitet/'
+INPUT_FILE = os.path.join(DIRECTORY_PATH, INPUT_FILENAME)
+OUTPUT_FILE = os.path.join(OUTPUT_TXT_PATH, os.path.splitext(INPUT_FILENAME)[0]+'_workflow.xml')
+CACHE_DIRECTORY = os.path.join(OUTPUT_TXT_PATH, 'workflow_cache')
+
+# Model name of the LLM steps for 'openai' / 'straico' (provider: main.PROVIDER). None selects it with
+# main.configure_api() as soon as an LLM step has to run; the cached results of the LLM steps are then reused
+# whatever model produced them.
+LLM_MODEL = None
+
+HASH_BLOCK_SIZE = 2 ** 20
+
+Step = namedtuple('Step', ['name', 'module', 'run', 'llm'])
+
+
+def run_paragraph(module, input_file, output_file, model):
+    checkpoint_file = output_file + '.check.json'
+    module.process_xml_file(main.PROVIDER, model, input_file, checkpoint_file, output_file,
+                            concurrency=main.CONCURRENCY, deduplicate=main.DEDUPLICATE)
+
+
+def run_article(module, input_file, output_file, model):
+    checkpoint_file = output_file + '.check.json'
+    limits = main.get_model_limits(main.PROVIDER, model)
+    module.process_xml_file(main.PROVIDER, model, input_file, checkpoint_file, output_file, limits=limits,
+                            concurrency=main.CONCURRENCY)
+
+
+def run_absatz(module, input_file, output_file, model):
+    tree = etree.parse(input_file)
+    module.split_paragraphs(tree.getroot())
+    tree.write(output_file, encoding='utf-8', xml_declaration=True)
+
+
+def run_ueberschrift(module, input_file, output_file, model):
+    root = module.convert_headlines(etree.parse(input_file).getroot())
+    etree.ElementTree(root).write(output_file, encoding='utf-8', xml_declaration=True, pretty_print=True)
+
+
+def run_bibelstellen(module, input_file, output_file, model):
+    tree = module.read_xml_file(input_file)
+    root = module.find_and_translate_bible_elements(tree.getroot(), module.transl_bibl_en_de)
+    ET.ElementTree(root).write(output_file, encoding='utf-8', xml_declaration=True)
+
+
+STEPS = [
+    Step('paragraph', 'process_xml_paragraph', run_paragraph, True),
+    Step('absatz', 'absatz_in_xml', run_absatz, False),
+    Step('article', 'process_xml_article', run_article, True),
+    Step('ueberschrift', 'ueberschrift_in_xml', run_ueberschrift, False),
+    Step('bibelstellen', 'bibelstellen_en_de', run_bibelstellen, False),
+]
+
+
+def file_hash(file_path):
+    """Returns the SHA-256 hex digest of the file content."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def step_params(step, module):
+    """
+    Returns the parameters that determine the result of a step.
+
+    Returns:
+    dict: Provider, model and prompt for LLM steps; the source code of script and adapter otherwise.
+    """
+    if step.llm:
+        return {'provider': main.PROVIDER, 'model': LLM_MODEL, 'prompt': module.get_prompt()}
+    return {'source': inspect.getsource(module), 'adapter': inspect.getsource(step.run)}
+
+
+def step_key(step, module, input_hash):
+    """Returns the cache key of a step for the given input."""
+    key = json.dumps({'step': step.name, 'input': input_hash, 'params': step_params(step, module)},
+                     sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def artifact_file(step, key, cache_directory):
+    return os.path.join(cache_directory, f"{step.name}_{key[:16]}.xml")
+
+
+def unfinished_articles(input_file, checkpoint_file):
+    """Returns the ids of the articles of input_file that are missing in the checkpoint: failed or not started."""
+    processed_articles = {}
+    if os.path.exists(checkpoint_file):
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            processed_articles = json.load(f)
+    return [article.get('id') for article in etree.parse(input_file).iter('article')
+            if article.get('id') is not None and article.get('id') not in processed_articles]
+
+
+def plan(input_file=INPUT_FILE, cache_directory=CACHE_DIRECTORY):
+    """
+    Determines the cached steps from the input file on. The key of a step depends on the content of the
+    previous result, so the plan stops at the first step that is not cached.
+
+    Returns:
+    list: (step, artifact file, cached) for every step; artifact file is None after the first missing step.
+    """
+    result = []
+    current = input_file
+    for step in STEPS:
+        if current is None:
+            result.append((step, None, False))
+            continue
+        module = importlib.import_module(step.module)
+        artifact = artifact_file(step, step_key(step, module, file_hash(current)), cache_directory)
+        cached = os.path.exists(artifact)
+        result.append((step, artifact, cached))
+        current = artifact if cached else None
+    return result
+
+
+def run_workflow(input_file=INPUT_FILE, output_file=OUTPUT_FILE, cache_directory=CACHE_DIRECTORY):
+    """
+    Runs the steps of the workflow, reusing the cached results whose key is unchanged.
+
+    Args:
+    input_file (str): The XML file of the lexicon.
+    output_file (str): The result of the last step is copied to this file.
+    cache_directory (str): Directory of the intermediate results.
+
+    Returns:
+    list: The names of the steps that were executed.
+    """
+    os.makedirs(cache_directory, exist_ok=True)
+    # The process log and the metrics are written next to the result of the workflow
+    main.set_paths(input_file, os.path.dirname(output_file) or '.')
+    os.makedirs(main.OUTPUT_TXT_PATH, exist_ok=True)
+    main.start_deadline()
+    model = None
+    executed = []
+    current = input_file
+    for step in STEPS:
+        module = importlib.import_module(step.module)
+        artifact = artifact_file(step, step_key(step, module, file_hash(current)), cache_directory)
+        if os.path.exists(artifact):
+            print(f"Step {step.name}: cached ({artifact})")
+            current = artifact
+            continue
+
+        print(f"Step {step.name}: running")
+        partial = artifact + '.partial'
+        if step.llm:
+            if model is None:
+                main.configure_logging()
+                model = LLM_MODEL or main.configure_api()
+            main.metrics.start(main.METRICS_FILE)
+            # An interrupted LLM step resumes from its partial result and checkpoint
+            source = partial if os.path.exists(partial) else current
+        else:
+            source = current
+        with profile_stage(step.name):
+            step.run(module, source, partial, model)
+        if step.llm:
+            main.metrics.report()
+            # Only a complete result is cached; the partial result and its checkpoint are resumed on the next
+            # run, which sends the failed and the not started articles again
+            if main.deadline_reached():
+                print(f"Run deadline reached during step {step.name}; run the workflow again to continue.")
+                return executed
+            unfinished = unfinished_articles(current, partial + '.check.json')
+            if unfinished:
+                print(f"Step {step.name}: {len(unfinished)} articles failed or were not processed "
+                      f"({', '.join(unfinished[:10])}{' ...' if len(unfinished) > 10 else ''}); "
+                      f"run the workflow again to retry them.")
+                return executed
+        if not os.path.exists(partial):
+            # The LLM step did not change any article
+            shutil.copyfile(source, partial)
+        os.replace(partial, artifact)
+        if os.path.exists(partial + '.check.json'):
+            os.remove(partial + '.check.json')
+        executed.append(step.name)
+        current = artifact
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    shutil.copyfile(current, output_file)
+    print(f"Workflow completed: {output_file}")
+    return executed
+
+
+def print_status(input_file=INPUT_FILE, cache_directory=CACHE_DIRECTORY):
+    for step, artifact, cached in plan(input_file, cache_directory):
+        print(f"{step.name:<14}{'cached' if cached else 'to run':<8}{artifact or ''}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'status':
+        print_status()
+    else:
+        main.set_paths(INPUT_FILE, OUTPUT_TXT_PATH)
+        configure_profiling(main.PROCESS_LOG_FILE, main.PROFILE, main.PROFILE_MEMORY)
+        run_workflow()